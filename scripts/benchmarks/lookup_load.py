@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# Load-tests testlists.lookup, either in this process or through a running
+# lookup-server.py, with a mix of listed URLs and unknown hosts, and
+# prints the query rate and the latency percentiles seen by the clients.
+#
+# $ python scripts/benchmarks/lookup_load.py lists/ --threads 8 --duration 10
+# $ python scripts/benchmarks/lookup_load.py lists/ --server http://127.0.0.1:8080
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit, quote
+
+# XXX perhaps make this better
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from testlists import corpus
+from testlists.lookup import Lookup
+
+def make_queries(lists_path, count, miss_rate, seed=0):
+    rng = random.Random(seed)
+    lists = corpus.load(lists_path)
+    urls = [row[0] for country_code in lists.country_codes
+            for row in lists.rows(country_code) if row]
+    queries = []
+    for idx in range(count):
+        if rng.random() < miss_rate:
+            queries.append("https://unlisted%d.example.org/" % idx)
+        else:
+            queries.append(rng.choice(urls))
+    return queries
+
+def percentile(durations, q):
+    return durations[min(len(durations) - 1, int(q * len(durations)))] * 1000
+
+class LocalClient(object):
+    def __init__(self, lookup):
+        self.lookup = lookup
+
+    def query(self, url):
+        self.lookup.lookup(url)
+
+    def close(self):
+        pass
+
+class HTTPClient(object):
+    def __init__(self, server_url):
+        parts = urlsplit(server_url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+
+    def get(self, path):
+        self.conn.request("GET", path)
+        response = self.conn.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError("%s returned %d" % (path, response.status))
+        return json.loads(body)
+
+    def query(self, url):
+        self.get("/lookup?url=" + quote(url, safe=""))
+
+    def close(self):
+        self.conn.close()
+
+def worker(client, queries, offset, deadline, durations):
+    idx = offset
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            client.query(queries[idx % len(queries)])
+            durations.append(time.perf_counter() - start)
+            idx += 1
+    finally:
+        client.close()
+
+def main(lists_path, threads, duration, miss_rate, server_url=None):
+    queries = make_queries(lists_path, 100000, miss_rate)
+    lookup = None
+    if server_url is None:
+        lookup = Lookup(lists_path, reload_interval=0)
+        make_client = lambda: LocalClient(lookup)
+    else:
+        make_client = lambda: HTTPClient(server_url)
+
+    results = [[] for _ in range(threads)]
+    deadline = time.monotonic() + duration
+    workers = [
+        threading.Thread(target=worker, args=(make_client(), queries,
+                                              idx * 7919, deadline, results[idx]))
+        for idx in range(threads)
+    ]
+    start = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    durations = sorted(d for result in results for d in result)
+    print("{} queries in {:.1f}s with {} threads: {:.0f} queries/s, "
+          "p50 {:.3f} ms, p99 {:.3f} ms".format(
+              len(durations), elapsed, threads, len(durations) / elapsed,
+              percentile(durations, 0.50), percentile(durations, 0.99)))
+    if lookup is not None:
+        status = lookup.status()
+    else:
+        status = HTTPClient(server_url).get("/metrics")
+    print("Reported by the lookup: {}".format(json.dumps(status, sort_keys=True)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load-test the test lists lookup')
+    parser.add_argument('lists_path', metavar='LISTS_PATH', help='path to the test list')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='number of clients querying at the same time')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds to run for')
+    parser.add_argument('--miss-rate', type=float, default=0.5,
+                        help='share of the queries for hosts that are not listed')
+    parser.add_argument('--server', metavar='URL', default=None,
+                        help='query a running lookup-server.py instead of a '
+                        'lookup in this process')
+    args = parser.parse_args()
+    main(args.lists_path, args.threads, args.duration, args.miss_rate,
+         server_url=args.server)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Compares the memory held by the rows of a synthetic corpus when they are
+# loaded as csv.DictReader dicts, as the tuples of testlists.corpus and as
+# testlists.entry.TestListEntry objects.
+#
+# $ python scripts/benchmarks/memory.py --rows 1000000
+
+import os
+import sys
+import csv
+import gc
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+# XXX perhaps make this better
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from testlists import corpus
+from testlists.entry import EntryTable
+import synthetic
+
+def load_dicts(lists_path):
+    rows = []
+    for csv_path in corpus.list_paths(lists_path):
+        with open(csv_path, 'r', encoding='utf-8', newline='') as in_file:
+            rows.extend(csv.DictReader(in_file, delimiter=','))
+    return rows
+
+def load_tuples(lists_path):
+    lists = corpus.Corpus(lists_path)
+    return [row for country_code in lists.country_codes
+            for row in lists.rows(country_code)]
+
+def load_entries(lists_path):
+    lists = corpus.Corpus(lists_path)
+    table = EntryTable()
+    entries = []
+    for country_code in lists.country_codes:
+        entries.extend(lists.entries(country_code, table))
+    return entries, table
+
+LOADERS = [
+    ("dict rows", load_dicts),
+    ("tuple rows", load_tuples),
+    ("TestListEntry", load_entries),
+]
+
+def measure(loader, lists_path):
+    """
+    Returns the bytes still allocated once loader returned, the peak while
+    it ran and how long it took.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = loader(lists_path)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current, peak, elapsed
+
+def main(rows, countries):
+    with tempfile.TemporaryDirectory(prefix="testlists-memory-") as work_path:
+        lists_path = os.path.join(work_path, "lists")
+        synthetic.generate(lists_path, rows, countries=countries)
+        total = sum(1 for _ in load_tuples(lists_path))
+        print("{} rows in {} lists".format(total, len(corpus.list_paths(lists_path))))
+        baseline = None
+        for name, loader in LOADERS:
+            current, peak, elapsed = measure(loader, lists_path)
+            if baseline is None:
+                baseline = current
+            print("{:<16} {:8.1f} MiB held {:6.0f} B/row {:8.1f} MiB peak "
+                  "{:7.2f}s {:6.1f}% of dict rows".format(
+                      name, current / 2**20, current / total, peak / 2**20,
+                      elapsed, 100.0 * current / baseline))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the memory used by the row representations')
+    parser.add_argument('--rows', type=int, default=200000,
+                        help='number of rows of the synthetic corpus')
+    parser.add_argument('--countries', type=int, default=100,
+                        help='number of country lists')
+    args = parser.parse_args()
+    main(args.rows, args.countries)
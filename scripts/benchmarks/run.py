@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# Times the core functions of the list maintenance scripts on synthetic
+# corpora and records the results as JSON, so that they can be compared
+# between commits.
+#
+# $ python scripts/benchmarks/run.py --output bench.json
+# $ python scripts/benchmarks/run.py --compare bench.json
+
+import io
+import os
+import sys
+import json
+import zlib
+import time
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import importlib.util
+
+# XXX perhaps make this better
+SCRIPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(SCRIPTS_PATH)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from testlists import corpus
+import synthetic
+
+def load_script(name):
+    """
+    Imports one of the scripts, which cannot be imported by name because
+    of the dashes.
+    """
+    path = os.path.join(SCRIPTS_PATH, name + ".py")
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def fake_resolver(failure_rate):
+    # crc32 rather than hash(), which is salted per process, so that the
+    # same domains fail in every run
+    def resolve(domain):
+        if zlib.crc32(domain.encode()) % 1000 < failure_rate * 1000:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+    return resolve
+
+def reset_corpus(lists_path):
+    corpus.load(lists_path).invalidate()
+
+def bench_lint_main(lint, lists_path):
+    try:
+        lint.main(lists_path)
+    except SystemExit:
+        pass
+
+def bench_check(lint, lists_path):
+    lists = corpus.load(lists_path)
+    urls = [row[0] for cc in lists.country_codes for row in lists.rows(cc) if row]
+    def run():
+        for url in urls:
+            lint.check(url)
+    return run
+
+def bench_get_failed_domains(prune, lists_path, failure_rate):
+    domains = list(corpus.load(lists_path).domains())
+    def run():
+        prune.get_failed_domains(domains, resolve=fake_resolver(failure_rate))
+    return run
+
+def bench_fixup(fix_dupe, lists_path):
+    url_category_map, csv_paths = fix_dupe.load_corpus(lists_path)
+    to_fixup = [
+        (url, set(opt.category_code for opt in options))
+        for url, options in sorted(url_category_map.items())
+        if len(set(opt.category_code for opt in options)) > 1
+    ]
+    fixes = fix_dupe.plan_fixes(to_fixup, url_category_map, csv_paths)
+    def run():
+        for file_name, file_fixes in fixes.items():
+            fix_dupe.fixup(file_name, file_fixes)
+    return run
+
+def timed(func, repeat, setup=None):
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_size(work_path, rows, countries, dupe_rate, conflict_rate,
+             failure_rate, repeat):
+    lint = load_script("lint-lists")
+    prune = load_script("prune-dead-urls")
+    fix_dupe = load_script("fix-dupe-categories")
+
+    lists_path = os.path.join(work_path, "lists-%d" % rows)
+    synthetic.generate(lists_path, rows, countries=countries,
+                       dupe_rate=dupe_rate, conflict_rate=conflict_rate)
+    global_path = os.path.join(lists_path, "global.csv")
+    results = {}
+
+    results["lint-lists.main"] = timed(
+        lambda: bench_lint_main(lint, lists_path), repeat,
+        setup=lambda: reset_corpus(lists_path))
+    results["lint-lists.load_global_list"] = timed(
+        lambda: lint.load_global_list(global_path), repeat,
+        setup=lambda: reset_corpus(lists_path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        check = bench_check(lint, lists_path)
+    results["lint-lists.check"] = timed(check, repeat)
+    results["prune-dead-urls.get_failed_domains"] = timed(
+        bench_get_failed_domains(prune, lists_path, failure_rate), repeat)
+
+    # fixup rewrites the lists, so it runs last and on a fresh copy
+    fixup_path = lists_path + "-fixup"
+    def fixup_setup():
+        shutil.rmtree(fixup_path, ignore_errors=True)
+        shutil.copytree(lists_path, fixup_path)
+    fixup_times = []
+    for _ in range(repeat):
+        fixup_setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = bench_fixup(fix_dupe, fixup_path)
+        fixup_times.append(timed(run, 1))
+        reset_corpus(fixup_path)
+    results["fix-dupe-categories.fixup"] = min(fixup_times)
+    shutil.rmtree(fixup_path, ignore_errors=True)
+    shutil.rmtree(lists_path, ignore_errors=True)
+    return results
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=SCRIPTS_PATH,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old, new):
+    old_results = dict(((r["rows"], r["function"]), r["seconds"]) for r in old["results"])
+    for r in new["results"]:
+        before = old_results.get((r["rows"], r["function"]))
+        if before is None:
+            continue
+        change = (r["seconds"] - before) / before * 100 if before else 0
+        print("{:>8} {:<40} {:10.4f}s -> {:10.4f}s ({:+.1f}%)".format(
+            r["rows"], r["function"], before, r["seconds"], change))
+
+def main(sizes, countries, dupe_rate, conflict_rate, failure_rate, repeat,
+         output_path=None, compare_path=None):
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "parameters": {
+            "countries": countries, "dupe_rate": dupe_rate,
+            "conflict_rate": conflict_rate, "failure_rate": failure_rate,
+            "repeat": repeat
+        },
+        "results": []
+    }
+    with tempfile.TemporaryDirectory(prefix="testlists-bench-") as work_path:
+        for rows in sizes:
+            results = run_size(work_path, rows, countries, dupe_rate,
+                               conflict_rate, failure_rate, repeat)
+            for function, seconds in results.items():
+                print("{:>8} {:<40} {:10.4f}s".format(rows, function, seconds))
+                report["results"].append({
+                    "rows": rows, "function": function, "seconds": seconds
+                })
+
+    if output_path:
+        with open(output_path, "w") as out_file:
+            json.dump(report, out_file, indent=2)
+    if compare_path:
+        with open(compare_path) as in_file:
+            print("---------- compared to {}".format(compare_path))
+            compare(json.load(in_file), report)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the list maintenance scripts')
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='comma separated numbers of rows to generate')
+    parser.add_argument('--countries', type=int, default=100)
+    parser.add_argument('--dupe-rate', type=float, default=0.05,
+                        help='fraction of rows repeating a URL of another list')
+    parser.add_argument('--conflict-rate', type=float, default=0.2,
+                        help='fraction of repeated URLs with another category')
+    parser.add_argument('--failure-rate', type=float, default=0.05,
+                        help='fraction of domains the fake resolver fails')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', metavar='OUTPUT_PATH', default=None,
+                        help='where to write the JSON results')
+    parser.add_argument('--compare', metavar='RESULTS_PATH', default=None,
+                        help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+    main([int(s) for s in args.sizes.split(',')], args.countries,
+         args.dupe_rate, args.conflict_rate, args.failure_rate, args.repeat,
+         output_path=args.output, compare_path=args.compare)
@@ -0,0 +1,69 @@
+"""
+Generates synthetic test lists to benchmark the maintenance scripts on
+corpora larger than the real one.
+"""
+import os
+import csv
+import random
+
+from testlists.corpus import HEADER
+
+CATEGORIES = [
+    ("News Media", "NEWS"), ("Human Rights Issues", "HUMR"),
+    ("Political Criticism", "POLR"), ("Gambling", "GMB"),
+    ("Social Networking", "GRP"), ("Media sharing", "MMED"),
+    ("Government", "GOVT"), ("Anonymization and circumvention tools", "ANON"),
+]
+
+def write_legend(lists_path):
+    with open(os.path.join(lists_path, "00-LEGEND-new_category_codes.csv"), 'w') as out_file:
+        writer = csv.writer(out_file, lineterminator='\n')
+        writer.writerow(["Category Description", "New Code",
+                         "Replaces old code(s)", "Description"])
+        for desc, code in CATEGORIES:
+            writer.writerow([desc, code, code, desc])
+
+def random_row(rng, url):
+    desc, code = rng.choice(CATEGORIES)
+    date_added = "20%02d-%02d-%02d" % (rng.randint(14, 24), rng.randint(1, 12),
+                                       rng.randint(1, 28))
+    return [url, code, desc, date_added, "synthetic", ""]
+
+def generate(lists_path, rows, countries=100, dupe_rate=0.05,
+             conflict_rate=0.2, domains_per_host=4, seed=0):
+    """
+    Writes rows URLs split across countries lists plus global.csv into
+    lists_path. dupe_rate of the rows repeat a URL that is already listed
+    elsewhere, and conflict_rate of those repeats use another category.
+    """
+    rng = random.Random(seed)
+    os.makedirs(lists_path, exist_ok=True)
+    write_legend(lists_path)
+    country_codes = ["global"] + ["c%03d" % i for i in range(countries)]
+    per_country = max(1, rows // len(country_codes))
+    listed = []
+    for country_code in country_codes:
+        with open(os.path.join(lists_path, country_code + ".csv"), 'w') as out_file:
+            writer = csv.writer(out_file, lineterminator='\n')
+            writer.writerow(HEADER)
+            seen = set()
+            for idx in range(per_country):
+                if listed and rng.random() < dupe_rate:
+                    row = list(rng.choice(listed))
+                    if row[0] in seen:
+                        continue
+                    if rng.random() < conflict_rate:
+                        desc, code = rng.choice(CATEGORIES)
+                        row[1] = code
+                        row[2] = desc
+                else:
+                    host = "site%d.%s.example%d.com" % (
+                        len(listed) // domains_per_host, country_code,
+                        len(listed) % 7)
+                    row = random_row(rng, "https://%s/%d" % (host, idx))
+                    # Duplicates of global.csv entries are lint errors
+                    if country_code != "global":
+                        listed.append(row)
+                seen.add(row[0])
+                writer.writerow(row)
+    return country_codes
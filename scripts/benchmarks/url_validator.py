@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# Times testlists.validate.validate_url() against the check() that
+# lint-lists.py used before it, on every URL of the test lists. The
+# mismatches between the two are also reported, but are tested by
+# tests/test_validate.py.
+#
+# $ python scripts/benchmarks/url_validator.py lists/
+
+import os
+import sys
+import time
+import argparse
+
+# XXX perhaps make this better
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from testlists import corpus
+from testlists.validate import validate_url
+from tests.test_validate import reference_check as legacy_check, check, EDGE_CASES
+
+def conformance(urls):
+    mismatches = []
+    for url in urls:
+        if legacy_check(url) != check(url):
+            mismatches.append((url, legacy_check(url), check(url)))
+    return mismatches
+
+def timeit(func, urls, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url in urls:
+            func(url)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(lists_path, repeat=5):
+    lists = corpus.load(lists_path)
+    urls = [row[0] for cc in lists.country_codes for row in lists.rows(cc) if row]
+    mismatches = conformance(urls + EDGE_CASES)
+    print('Checked {} URLs, {} mismatches'.format(len(urls) + len(EDGE_CASES),
+                                                  len(mismatches)))
+    for url, expected, got in mismatches:
+        print('  {!r}: legacy {!r}, validate_url {!r}'.format(url, expected, got))
+
+    legacy = timeit(legacy_check, urls, repeat)
+    new = timeit(validate_url, urls, repeat)
+    print('legacy check():  {:.0f} ns/URL'.format(legacy / len(urls) * 1e9))
+    print('validate_url():  {:.0f} ns/URL ({:.1f}x)'.format(new / len(urls) * 1e9,
+                                                          legacy / new))
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare validate_url() with the legacy check()')
+    parser.add_argument('lists_path', metavar='LISTS_PATH', help='path to the test list')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.lists_path, repeat=args.repeat)
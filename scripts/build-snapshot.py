@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# Builds a compact binary snapshot of all the test lists, which probes can
+# memory-map instead of parsing every CSV file. See testlists/snapshot.py
+# for the format.
+#
+# $ python scripts/build-snapshot.py lists/ output/test-lists.snapshot
+
+import os
+import argparse
+
+from testlists import corpus, snapshot
+
+
+def main(lists_path, output_path):
+    lists = corpus.load(lists_path)
+    snapshot.write_snapshot(lists, output_path)
+    with snapshot.Snapshot(output_path) as snap:
+        total_urls = sum(len(snap.urls(cc)) for cc in snap.country_codes)
+        print('Wrote {} URLs in {} countries to {} ({} bytes)'.format(
+            total_urls, len(snap.country_codes), output_path,
+            os.path.getsize(output_path)
+        ))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build a binary snapshot of the test lists')
+    parser.add_argument('lists_path', metavar='LISTS_PATH', help='path to the test list')
+    parser.add_argument('output_path', metavar='OUTPUT_PATH', nargs='?',
+                        default=os.path.join('output', 'test-lists.snapshot'),
+                        help='where to write the snapshot')
+    args = parser.parse_args()
+    main(args.lists_path, args.output_path)
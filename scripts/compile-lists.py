@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# Compiles, for every country of 00-LEGEND-country_codes.csv and every
+# other country list, one snapshot with the URLs of its list merged with
+# the global list, so that a probe only has to fetch a single file. When
+# a URL is in both, the entry of the country list is kept. A manifest
+# lists the SHA-256 of every artifact, to verify them once downloaded.
+#
+# $ python scripts/compile-lists.py lists/ output/compiled/
+# $ python scripts/compile-lists.py --verify output/compiled/
+
+import os
+import csv
+import sys
+import json
+import glob
+import argparse
+
+from testlists import corpus, snapshot
+from testlists.corpus import file_digest
+from testlists.lint import COUNTRY_CODES
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+def load_country_codes(lists_path):
+    with open(os.path.join(lists_path, COUNTRY_CODES), encoding='utf-8',
+              newline='') as in_file:
+        reader = csv.reader(in_file, delimiter=',')
+        next(reader)
+        return [row[0].lower() for row in reader if row]
+
+def merge_rows(country_rows, global_rows):
+    """
+    Returns the rows of the country list followed by those of the global
+    list, keeping only the first row of every URL. Also returns how many
+    of them come from each list.
+    """
+    seen = set()
+    merged = []
+    counts = []
+    for rows in (country_rows, global_rows):
+        count = 0
+        for row in rows:
+            if len(row) != len(corpus.HEADER) or row[0] in seen:
+                continue
+            seen.add(row[0])
+            merged.append(row)
+            count += 1
+        counts.append(count)
+    return merged, counts
+
+def compile_country(lists, country_code, global_rows, output_path):
+    country_rows = []
+    if country_code in lists.paths:
+        country_rows = lists.rows(country_code)
+    merged, (country_count, global_count) = merge_rows(country_rows, global_rows)
+    writer = snapshot.SnapshotWriter()
+    writer.add_country(country_code, merged)
+    writer.write(output_path)
+    return {
+        'path': os.path.basename(output_path),
+        'sha256': file_digest(output_path),
+        'size': os.path.getsize(output_path),
+        'urls': len(merged),
+        'country_urls': country_count,
+        'global_urls': global_count
+    }
+
+def stale_artifacts(output_directory, artifacts):
+    """
+    Returns the paths of the snapshots of output_directory that are not
+    among artifacts, such as those of countries that were removed.
+    """
+    paths = set(artifact['path'] for artifact in artifacts.values())
+    return sorted(
+        path for path in glob.glob(os.path.join(output_directory, '*.snapshot'))
+        if os.path.basename(path) not in paths
+    )
+
+def write_manifest(output_directory, manifest):
+    manifest_path = os.path.join(output_directory, MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as out_file:
+        json.dump(manifest, out_file, indent=2, sort_keys=True)
+        out_file.write('\n')
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def compile_lists(lists_path, output_directory):
+    os.makedirs(output_directory, exist_ok=True)
+    lists = corpus.load(lists_path)
+    global_rows = lists.rows('global') if 'global' in lists.paths else []
+    country_codes = load_country_codes(lists_path)
+    # Lists missing from the legend are still compiled, as probes may use
+    # them
+    unknown = sorted(set(lists.country_codes) - set(country_codes) - set(['global']))
+
+    artifacts = {}
+    for country_code in country_codes + unknown:
+        output_path = os.path.join(output_directory, country_code + '.snapshot')
+        artifacts[country_code] = compile_country(lists, country_code,
+                                                  global_rows, output_path)
+    for path in stale_artifacts(output_directory, artifacts):
+        os.remove(path)
+    global_path = os.path.join(lists_path, 'global.csv')
+    write_manifest(output_directory, {
+        'version': MANIFEST_VERSION,
+        'global_sha256': file_digest(global_path) if os.path.isfile(global_path) else None,
+        'artifacts': artifacts
+    })
+    return artifacts, unknown
+
+def verify(output_directory):
+    """
+    Returns the country codes whose artifact does not match the manifest,
+    and the snapshots of output_directory that are not in it.
+    """
+    with open(os.path.join(output_directory, MANIFEST)) as in_file:
+        manifest = json.load(in_file)
+    invalid = []
+    for country_code, artifact in sorted(manifest['artifacts'].items()):
+        path = os.path.join(output_directory, artifact['path'])
+        if not os.path.isfile(path) or file_digest(path) != artifact['sha256']:
+            invalid.append(country_code)
+    return invalid, stale_artifacts(output_directory, manifest['artifacts'])
+
+def main(lists_path, output_directory):
+    artifacts, unknown = compile_lists(lists_path, output_directory)
+    for country_code in unknown:
+        print('Warning: {}.csv is not in {}'.format(
+            country_code, COUNTRY_CODES))
+    print('Compiled {} countries ({} URLs, {} bytes) to {}'.format(
+        len(artifacts), sum(a['urls'] for a in artifacts.values()),
+        sum(a['size'] for a in artifacts.values()), output_directory))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compile one merged list per country')
+    parser.add_argument('lists_path', metavar='LISTS_PATH', nargs='?', default='lists',
+                        help='path to the test list')
+    parser.add_argument('output_directory', metavar='OUTPUT_DIRECTORY', nargs='?',
+                        default=os.path.join('output', 'compiled'),
+                        help='where to write the artifacts and the manifest')
+    parser.add_argument('--verify', metavar='DIRECTORY', default=None,
+                        help='check the artifacts of DIRECTORY against its manifest '
+                        'instead of compiling')
+    args = parser.parse_args()
+    if args.verify:
+        invalid, unlisted = verify(args.verify)
+        for country_code in invalid:
+            print('{}: does not match the manifest'.format(country_code))
+        for path in unlisted:
+            print('{}: is not in the manifest'.format(path))
+        if invalid or unlisted:
+            sys.exit(1)
+        print('All artifacts match the manifest')
+    else:
+        main(args.lists_path, args.output_directory)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# Compares two versions of the test lists and reports, as JSON, the URLs
+# that were added, removed, re-categorized, otherwise modified or moved
+# from some countries to others. Both versions can be lists directories
+# or snapshots built by build-snapshot.py.
+#
+# Lists whose content hash did not change are skipped, and only the rows
+# that differ between two versions of a list are compared, so the time
+# taken depends on the size of the changes. Rows with the wrong number of
+# columns are left out, as they are from snapshots, and listed on stderr.
+#
+# $ python scripts/diff-lists.py old/lists/ lists/ --output changes.json
+
+import os
+import csv
+import sys
+import json
+import hashlib
+import argparse
+from collections import Counter
+
+from testlists import corpus, snapshot
+from testlists.corpus import file_digest
+
+FIELDS = corpus.HEADER
+
+class TreeLists(object):
+    digest_kind = 'file'
+
+    def __init__(self, lists_path):
+        self.paths = dict(
+            (corpus.get_country_code(csv_path), csv_path)
+            for csv_path in corpus.list_paths(lists_path)
+        )
+        # (csv_path, line number) of the rows left out of rows()
+        self.invalid_rows = []
+
+    @property
+    def country_codes(self):
+        return set(self.paths.keys())
+
+    def digest(self, country_code):
+        return file_digest(self.paths[country_code])
+
+    def rows(self, country_code):
+        with open(self.paths[country_code], 'r', encoding='utf-8',
+                  newline='') as in_file:
+            reader = csv.reader(in_file, delimiter=',')
+            next(reader, None)
+            rows = []
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) != len(FIELDS):
+                    self.invalid_rows.append((self.paths[country_code],
+                                              reader.line_num))
+                    continue
+                rows.append(tuple(row))
+            return rows
+
+    def close(self):
+        pass
+
+class SnapshotLists(object):
+    # The string IDs of two snapshots are not comparable, so the rows are
+    # decoded to be hashed
+    digest_kind = 'rows'
+
+    def __init__(self, snapshot_path):
+        self.snapshot = snapshot.Snapshot(snapshot_path)
+        # The snapshot writer already left them out
+        self.invalid_rows = []
+
+    @property
+    def country_codes(self):
+        return set(self.snapshot.country_codes)
+
+    def rows(self, country_code):
+        return list(self.snapshot.rows(country_code))
+
+    def digest(self, country_code):
+        h = hashlib.sha256()
+        for row in self.snapshot.rows(country_code):
+            h.update('\0'.join(row).encode('utf-8'))
+            h.update(b'\n')
+        return h.hexdigest()
+
+    def close(self):
+        self.snapshot.close()
+
+def open_lists(path):
+    if os.path.isdir(path):
+        return TreeLists(path)
+    return SnapshotLists(path)
+
+def changed_rows(old_rows, new_rows):
+    """
+    Returns the rows that are only in the old and only in the new version
+    of a list, as lists of rows by URL. A row listed twice in one version
+    and once in the other is counted as changed once.
+    """
+    old_only = {}
+    new_only = {}
+    for rows, other_rows, only in ((old_rows, new_rows, old_only),
+                                   (new_rows, old_rows, new_only)):
+        for row in (Counter(rows) - Counter(other_rows)).elements():
+            only.setdefault(row[0], []).append(row)
+    return old_only, new_only
+
+def pair_rows(old_rows, new_rows):
+    """
+    Pairs the old rows of a URL with its new rows, those with the same
+    category first. Returns the pairs, then the old and the new rows that
+    are left over.
+    """
+    old_rows = list(old_rows)
+    new_rows = list(new_rows)
+    pairs = []
+    for new_row in list(new_rows):
+        for old_row in old_rows:
+            if old_row[1:2] == new_row[1:2]:
+                pairs.append((old_row, new_row))
+                old_rows.remove(old_row)
+                new_rows.remove(new_row)
+                break
+    count = min(len(old_rows), len(new_rows))
+    pairs.extend(zip(old_rows[:count], new_rows[:count]))
+    return pairs, old_rows[count:], new_rows[count:]
+
+def diff_lists(old, new):
+    changes = {
+        'added': [],
+        'removed': [],
+        'recategorized': [],
+        'modified': [],
+        'moved': []
+    }
+    added_to = {}
+    removed_from = {}
+    compared = skipped = 0
+    same_digests = old.digest_kind == new.digest_kind
+
+    for country_code in sorted(old.country_codes | new.country_codes):
+        in_old = country_code in old.country_codes
+        in_new = country_code in new.country_codes
+        if in_old and in_new and same_digests and \
+                old.digest(country_code) == new.digest(country_code):
+            skipped += 1
+            continue
+        compared += 1
+        old_only, new_only = changed_rows(
+            old.rows(country_code) if in_old else [],
+            new.rows(country_code) if in_new else []
+        )
+        for url in set(old_only) | set(new_only):
+            pairs, old_rows, new_rows = pair_rows(old_only.get(url, []),
+                                                  new_only.get(url, []))
+            for row in new_rows:
+                added_to.setdefault(url, []).append((country_code, row))
+            for row in old_rows:
+                removed_from.setdefault(url, []).append((country_code, row))
+            for old_row, row in pairs:
+                if len(old_row) > 1 and len(row) > 1 and old_row[1] != row[1]:
+                    changes['recategorized'].append({
+                        'url': url,
+                        'country': country_code,
+                        'from': old_row[1],
+                        'to': row[1]
+                    })
+                else:
+                    changes['modified'].append({
+                        'url': url,
+                        'country': country_code,
+                        'fields': dict(
+                            (name, [old_value, new_value])
+                            for name, old_value, new_value in zip(FIELDS, old_row, row)
+                            if old_value != new_value
+                        )
+                    })
+
+    for url in sorted(set(added_to) | set(removed_from)):
+        if url in added_to and url in removed_from:
+            changes['moved'].append({
+                'url': url,
+                'from': [country_code for country_code, _ in removed_from[url]],
+                'to': [country_code for country_code, _ in added_to[url]]
+            })
+            continue
+        kind = 'added' if url in added_to else 'removed'
+        for country_code, row in (added_to.get(url) or removed_from[url]):
+            changes[kind].append({
+                'url': url,
+                'country': country_code,
+                'category_code': row[1] if len(row) > 1 else None
+            })
+
+    for kind in ['recategorized', 'modified']:
+        changes[kind].sort(key=lambda change: (change['url'], change['country']))
+    changes['lists'] = {'compared': compared, 'skipped': skipped}
+    return changes
+
+def main(old_path, new_path, output_path=None):
+    old = open_lists(old_path)
+    new = open_lists(new_path)
+    try:
+        changes = diff_lists(old, new)
+    finally:
+        old.close()
+        new.close()
+    for csv_path, line_number in old.invalid_rows + new.invalid_rows:
+        print('Skipped {}:{}, wrong number of columns'.format(csv_path, line_number),
+              file=sys.stderr)
+    changes['old'] = old_path
+    changes['new'] = new_path
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as out_file:
+            json.dump(changes, out_file, indent=2, ensure_ascii=False)
+            out_file.write('\n')
+    else:
+        json.dump(changes, sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write('\n')
+    print('{} added, {} removed, {} recategorized, {} modified, {} moved '
+          '({} lists compared, {} unchanged)'.format(
+              len(changes['added']), len(changes['removed']),
+              len(changes['recategorized']), len(changes['modified']),
+              len(changes['moved']), changes['lists']['compared'],
+              changes['lists']['skipped']), file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report the changes between two versions of the test lists')
+    parser.add_argument('old_path', metavar='OLD', help='lists directory or snapshot to compare from')
+    parser.add_argument('new_path', metavar='NEW', help='lists directory or snapshot to compare to')
+    parser.add_argument('--output', metavar='OUTPUT_PATH', default=None,
+                        help='where to write the changes (default: standard output)')
+    args = parser.parse_args()
+    main(args.old_path, args.new_path, args.output)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# Exports all the test lists to a single columnar file, to filter them by
+# category, country and date with vectorized operations. See
+# testlists/columnar.py for the format and the loader.
+#
+# $ python scripts/export-columnar.py lists/ output/test-lists.columns
+
+import os
+import argparse
+
+from testlists import columnar
+from testlists.entry import EntryTable
+
+
+def main(lists_path, output_path):
+    table = EntryTable()
+    rows = columnar.write_columns(lists_path, output_path, table)
+    for csv_path, line_number in table.invalid_rows:
+        print('Skipped {}:{}, wrong number of columns'.format(csv_path, line_number))
+    with columnar.Columns(output_path) as columns:
+        print('Wrote {} rows in {} countries and {} categories to {} ({} bytes)'.format(
+            rows, len(columns.dictionaries['country']),
+            len(columns.dictionaries['category_code']), output_path,
+            os.path.getsize(output_path)
+        ))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the test lists to a columnar file')
+    parser.add_argument('lists_path', metavar='LISTS_PATH', help='path to the test list')
+    parser.add_argument('output_path', metavar='OUTPUT_PATH', nargs='?',
+                        default=os.path.join('output', 'test-lists.columns'),
+                        help='where to write the columnar file')
+    args = parser.parse_args()
+    main(args.lists_path, args.output_path)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Reports every URL that is listed more than once across all the test
+# lists, with the countries and categories it is listed under.
+#
+# The lists are sorted by URL into bounded runs on disk, which are then
+# merged, so memory use does not depend on the size of the lists.
+#
+# $ python scripts/find-duplicates.py lists/ duplicates.jsonl
+
+import os
+import csv
+import sys
+import json
+import heapq
+import argparse
+import itertools
+import tempfile
+
+from testlists import corpus
+
+ENTRY_FIELDS = ['country', 'category_code', 'category_description',
+                'date_added', 'source', 'notes']
+
+def url_key(row):
+    return row[0]
+
+def write_run(rows, run_directory, runs):
+    rows.sort(key=url_key)
+    run_path = os.path.join(run_directory, 'run-%d.csv' % len(runs))
+    with open(run_path, 'w', encoding='utf-8', newline='') as out_file:
+        csv.writer(out_file, lineterminator='\n').writerows(rows)
+    runs.append(run_path)
+
+def make_runs(lists_path, run_directory, chunk_size):
+    """
+    Writes the rows of every list, prefixed with the country code, to runs
+    of at most chunk_size rows sorted by URL.
+    """
+    runs = []
+    for csv_path in corpus.list_paths(lists_path):
+        country_code = corpus.get_country_code(csv_path)
+        with open(csv_path, 'r', encoding='utf-8', newline='') as in_file:
+            reader = csv.reader(in_file, delimiter=',')
+            next(reader) # Skip header
+            rows = []
+            for row in reader:
+                if len(row) != 6:
+                    continue
+                rows.append([row[0], country_code] + row[1:])
+                if len(rows) >= chunk_size:
+                    write_run(rows, run_directory, runs)
+                    rows = []
+            if rows:
+                write_run(rows, run_directory, runs)
+    return runs
+
+def read_run(run_path):
+    with open(run_path, 'r', encoding='utf-8', newline='') as in_file:
+        for row in csv.reader(in_file):
+            yield row
+
+def merge_runs(runs, run_directory, max_fan_in):
+    """
+    Merges the runs max_fan_in at a time until they can all be merged at
+    once, so the number of open files stays bounded.
+    """
+    while len(runs) > max_fan_in:
+        merged = []
+        for idx in range(0, len(runs), max_fan_in):
+            batch = runs[idx:idx+max_fan_in]
+            rows = heapq.merge(*[read_run(r) for r in batch], key=url_key)
+            run_path = os.path.join(run_directory, 'merged-%d-%d.csv' % (len(runs), idx))
+            with open(run_path, 'w', encoding='utf-8', newline='') as out_file:
+                csv.writer(out_file, lineterminator='\n').writerows(rows)
+            for r in batch:
+                os.remove(r)
+            merged.append(run_path)
+        runs = merged
+    return heapq.merge(*[read_run(r) for r in runs], key=url_key)
+
+def find_duplicates(lists_path, chunk_size=100000, max_fan_in=128):
+    """
+    Yields a report for every URL listed more than once, in URL order.
+    """
+    with tempfile.TemporaryDirectory(prefix='find-duplicates-') as run_directory:
+        runs = make_runs(lists_path, run_directory, chunk_size)
+        for url, rows in itertools.groupby(merge_runs(runs, run_directory, max_fan_in),
+                                           key=url_key):
+            rows = list(rows)
+            if len(rows) < 2:
+                continue
+            entries = [dict(zip(ENTRY_FIELDS, row[1:])) for row in rows]
+            for entry in entries:
+                entry['csv_path'] = os.path.join(lists_path, entry['country'] + '.csv')
+            yield {
+                'url': url,
+                'countries': sorted(set(e['country'] for e in entries)),
+                'category_codes': sorted(set(e['category_code'] for e in entries)),
+                'entries': entries
+            }
+
+def main(lists_path, report_path=None, chunk_size=100000):
+    out_file = open(report_path, 'w', encoding='utf-8') if report_path else sys.stdout
+    total = 0
+    conflicts = 0
+    try:
+        for report in find_duplicates(lists_path, chunk_size=chunk_size):
+            out_file.write(json.dumps(report, ensure_ascii=False) + '\n')
+            total += 1
+            if len(report['category_codes']) > 1:
+                conflicts += 1
+    finally:
+        if report_path:
+            out_file.close()
+    print('{} duplicate URLs, {} with conflicting categories'.format(total, conflicts),
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report the URLs listed more than once')
+    parser.add_argument('lists_path', metavar='LISTS_PATH', help='path to the test list')
+    parser.add_argument('report_path', metavar='REPORT_PATH', nargs='?', default=None,
+                        help='where to write the JSON Lines report (stdout by default)')
+    parser.add_argument('--chunk-size', type=int, default=100000,
+                        help='maximum number of rows sorted in memory at once')
+    args = parser.parse_args()
+    main(args.lists_path, args.report_path, chunk_size=args.chunk_size)
@@ -1,61 +1,119 @@
 import os
 import sys
 import csv
+import json
+import argparse
 from collections import Counter
-from glob import glob
 
+from testlists import corpus
+from testlists.entry import EntryTable
 
-def fixup(url, url_category_map):
-    options = list(url_category_map[url])
+
+def choose_category(url, options):
     #most_common = Counter(map(lambda x: x[0], options)).most_common()
     #selected_option = most_common[0][0]
     #if most_common[0][1] == most_common[1][1]:
 
-    sorted_by_date = sorted(options, key=lambda x: x[3])
-    selected_option = sorted_by_date[-1][0]
+    sorted_by_date = sorted(options, key=lambda x: x.date_added)
+    selected_option = sorted_by_date[-1].category_code
     if ".gov/" in url:
         selected_option = "GOVT"
 
-    category_code, category_description, _, date_added, source, _ = list(filter(lambda x: x[0] == selected_option, options))[0]
-    print(f"Chosen {category_code}, {category_description}, {date_added}, {source}")
-
-    for opt in options:
-        with open(opt[2]) as in_file, open(opt[2]+'.tmp', "w") as out_file:
-            reader = csv.DictReader(in_file, delimiter=',')
-            writer = csv.DictWriter(out_file, delimiter=',', fieldnames=reader.fieldnames, quotechar='"', lineterminator='\n')
-            writer.writeheader()
-            for row in reader:
-                if row["url"] == url:
-                    row["category_code"] = category_code
-                    row["category_description"] = category_description
-                writer.writerow(row)
-        os.rename(opt[2]+'.tmp', opt[2])
-
-def main():
+    entry = list(filter(lambda x: x.category_code == selected_option, options))[0]
+    print(f"Chosen {entry.category_code}, {entry.category_description}, {entry.date_added}, {entry.source}")
+    return entry.category_code, entry.category_description
+
+def plan_fixes(to_fixup, url_category_map, csv_paths):
+    """
+    Returns, for every file that needs to be changed, the category code and
+    description to set for each of its conflicting URLs. csv_paths maps
+    the country of the entries to the file they come from.
+    """
+    fixes = {}
+    for url, category_codes in to_fixup:
+        print(f"{url}: {category_codes}")
+        options = url_category_map[url]
+        category = choose_category(url, options)
+        for opt in options:
+            if (opt.category_code, opt.category_description) != category:
+                fixes.setdefault(csv_paths[opt.country], {})[url] = category
+    return fixes
+
+def fixup(file_name, file_fixes):
+    with open(file_name) as in_file, open(file_name+'.tmp', "w") as out_file:
+        reader = csv.DictReader(in_file, delimiter=',')
+        writer = csv.DictWriter(out_file, delimiter=',', fieldnames=reader.fieldnames, quotechar='"', lineterminator='\n')
+        writer.writeheader()
+        for row in reader:
+            if row["url"] in file_fixes:
+                row["category_code"], row["category_description"] = file_fixes[row["url"]]
+            writer.writerow(row)
+    os.rename(file_name+'.tmp', file_name)
+
+def load_corpus(lists_path):
+    """
+    Returns the entries of every URL, and the file of each country.
+    """
     url_category_map = {}
-    for file_name in glob("lists/*.csv"):
-        if "00-" in file_name:
-            continue
-        with open(file_name) as in_file:
-            reader = csv.DictReader(in_file, delimiter=',')
-            for row in reader:
-                url = row["url"]
-                url_category_map[url] = url_category_map.get(url, [])
-                url_category_map[url].append(
-                        (row["category_code"], row["category_description"], file_name, row["date_added"], row["source"], row["notes"])
-                )
+    csv_paths = {}
+    table = EntryTable()
+    lists = corpus.load(lists_path)
+    for country_code, csv_path in lists.paths.items():
+        for entry in lists.entries(country_code, table):
+            url_category_map.setdefault(entry.url, []).append(entry)
+        csv_paths[table.country_id(country_code)] = csv_path
+    for csv_path, line_number in table.invalid_rows:
+        print(f"Skipping {csv_path}:{line_number}, wrong number of columns")
+    return url_category_map, csv_paths
+
+def load_report(report_path):
+    """
+    Loads the duplicates report written by find-duplicates.py, which
+    only has the URLs listed more than once.
+    """
+    url_category_map = {}
+    csv_paths = {}
+    table = EntryTable()
+    with open(report_path) as in_file:
+        for line in in_file:
+            report = json.loads(line)
+            entries = []
+            for e in report["entries"]:
+                country = table.country_id(e["country"])
+                csv_paths[country] = e["csv_path"]
+                entries.append(table.entry(
+                    (report["url"], e["category_code"], e["category_description"],
+                     e["date_added"], e["source"], e["notes"]), country))
+            url_category_map[report["url"]] = entries
+    return url_category_map, csv_paths
+
+def main(dry_run=False, report_path=None):
+    if report_path:
+        url_category_map, csv_paths = load_report(report_path)
+    else:
+        url_category_map, csv_paths = load_corpus("lists")
 
     to_fixup = []
     for url in sorted(url_category_map.keys()):
         category_tup = url_category_map[url]
-        category_codes = set(list(map(lambda x: x[0], category_tup)))
+        category_codes = set(list(map(lambda x: x.category_code, category_tup)))
         if len(category_codes) > 1:
             to_fixup.append((url, category_codes))
 
     print(f"dupes {len(to_fixup)}")
-    for url, category_codes in to_fixup:
-            print(f"{url}: {category_codes}")
-            fixup(url, url_category_map)
+    fixes = plan_fixes(to_fixup, url_category_map, csv_paths)
+
+    for file_name in sorted(fixes.keys()):
+        print(f"{file_name}: {len(fixes[file_name])} URLs to fix")
+        if not dry_run:
+            fixup(file_name, fixes[file_name])
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Pick a single category for URLs listed with different categories')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only print the planned changes')
+    parser.add_argument('--report', metavar='REPORT_PATH', default=None,
+                        help='use the duplicates found by find-duplicates.py '
+                        'instead of loading all the lists')
+    args = parser.parse_args()
+    main(dry_run=args.dry_run, report_path=args.report)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Exports the test lists to JSON, replacing scripts/legacy/bin/generate.
+# Rows are streamed straight from the CSV reader to the output file, so
+# no list is ever held in memory.
+#
+# $ python scripts/generate-json.py lists/ output/
+
+import os
+import csv
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+FORMATS = {
+    # A JSON array of objects, like the legacy generate
+    'json': ('[', ',\n', ']\n'),
+    # One JSON object per line
+    'jsonl': ('', '\n', '\n'),
+}
+
+def is_up_to_date(csv_path, output_path):
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(csv_path)
+    except OSError:
+        return False
+
+def generate_file(csv_path, output_path, output_format='json'):
+    start, separator, end = FORMATS[output_format]
+    with open(csv_path, 'r', encoding='utf-8', newline='') as in_file, \
+         open(output_path + '.tmp', 'w', encoding='utf-8') as out_file:
+        reader = csv.reader(in_file, delimiter=',')
+        header = next(reader)
+        out_file.write(start)
+        count = 0
+        for row in reader:
+            if count > 0:
+                out_file.write(separator)
+            out_file.write(json.dumps(dict(zip(header, row)),
+                                      separators=(',', ':'), ensure_ascii=False))
+            count += 1
+        if count > 0 or output_format == 'json':
+            out_file.write(end)
+    os.rename(output_path + '.tmp', output_path)
+    return count
+
+def generate_file_worker(args):
+    csv_path, output_path, output_format, force = args
+    if not force and is_up_to_date(csv_path, output_path):
+        return 'Skipping {} (up to date)'.format(csv_path)
+    count = generate_file(csv_path, output_path, output_format)
+    return 'Generated {} ({} rows) for {}'.format(output_path, count, csv_path)
+
+def main(lists_path, output_directory, output_format='json', jobs=1,
+         force=False):
+    os.makedirs(output_directory, exist_ok=True)
+    tasks = []
+    for csv_path in glob(os.path.join(lists_path, "*.csv")):
+        output_name = os.path.basename(csv_path)[:-len('.csv')] + '.' + output_format
+        tasks.append((csv_path, os.path.join(output_directory, output_name),
+                      output_format, force))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            messages = list(executor.map(generate_file_worker, tasks))
+    else:
+        messages = [generate_file_worker(task) for task in tasks]
+    for message in messages:
+        print(message)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the test lists to JSON')
+    parser.add_argument('lists_path', metavar='LISTS_PATH', help='path to the test list')
+    parser.add_argument('output_directory', metavar='OUTPUT_DIRECTORY', nargs='?',
+                        default='output', help='where to write the JSON files')
+    parser.add_argument('--format', choices=sorted(FORMATS.keys()), default='json',
+                        help='json for one array per list, jsonl for one object per line')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--force', action='store_true',
+                        help='regenerate the files that are already up to date')
+    args = parser.parse_args()
+    main(args.lists_path, args.output_directory, output_format=args.format,
+         jobs=args.jobs, force=args.force)
@@ -3,9 +3,9 @@ import csv
 
 def get(file_name):
     mapping = {}
-    with open(file_name, 'rb') as csvfile:
+    with open(file_name, 'r') as csvfile:
         reader = csv.reader(csvfile, delimiter=',')
-        reader.next()
+        next(reader)
         for row in reader:
             mapping[row[0].lower()] = row[1]
     return mapping
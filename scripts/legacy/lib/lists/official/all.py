@@ -1,6 +1,6 @@
 from lists.official.it import bofh, aams
 
 
-def update():
-    bofh.update()
-    aams.update()
+def update(skip_download=False):
+    bofh.update(skip_download)
+    aams.update(skip_download)
@@ -1,4 +1,5 @@
 # -*- encoding: utf-8 -*-
+import io
 import re
 import logging
 
@@ -23,6 +24,12 @@ class AAMSBlockList(Resource):
     name = "official/it/aams"
     key = "url"
     download_url = "ftp://ftp.finanze.it/pub/monopoli/elenco_siti_inibiti.rtf"
+    destination = "lists/official/it/aams.csv"
+
+    def parse_chunks(self, chunks):
+        # The RTF reader needs the whole document, so this one is not
+        # parsed while it is being downloaded
+        return self.parse(io.BytesIO(b"".join(chunks)))
 
     def parse(self, downloaded_file):
         logging.info("Parsing AAMS Block list")
@@ -39,7 +46,7 @@ class AAMSBlockList(Resource):
         doc.content[0].content
         siti = doc.content[0].content[3].content[0]
         for sito in siti.split("\n"):
-            m = re.search("(\d+)(.*)", sito)
+            m = re.search(r"(\d+)(.*)", sito)
             if m:
                 url = m.group(2)
                 yield {
@@ -49,5 +56,5 @@ class AAMSBlockList(Resource):
 
 def update(skip_download=False):
     logging.info("Updating AAMS Block list")
-    aams_block_list = AAMSBlockList('lists/official/it/aams.csv')
+    aams_block_list = AAMSBlockList()
     aams_block_list.update(skip_download)
@@ -2,9 +2,10 @@
 import logging
 
 from datetime import datetime
-from HTMLParser import HTMLParser
+from html.parser import HTMLParser
 
 from lists.resource import Resource
+from lists.stream import decode
 
 
 class BOFHParser(HTMLParser):
@@ -16,14 +17,19 @@ class BOFHParser(HTMLParser):
         HTMLParser.__init__(self)
         self.row = []
         self.items = []
+        # When the document is fed in chunks, text can be split over
+        # several handle_data() calls
+        self.in_data = False
 
     def handle_starttag(self, tag, attrs):
+        self.in_data = False
         if tag == "tbody":
             self.in_table = True
         if self.in_table and tag == "td":
             self.in_td = True
 
     def handle_endtag(self, tag):
+        self.in_data = False
         if tag == "tbody":
             self.in_table = False
         if self.in_table and tag == "td":
@@ -38,7 +44,11 @@ class BOFHParser(HTMLParser):
 
     def handle_data(self, data):
         if self.in_td is True:
-            self.row.append(data)
+            if self.in_data:
+                self.row[-1] += data
+            else:
+                self.row.append(data)
+            self.in_data = True
 
 
 def map_category(italian_category):
@@ -100,26 +110,35 @@ class BOFHBlockList(Resource):
     name = "official/it/bofh"
     key = "url"
     download_url = "http://censura.bofh.it/elenchi.html"
-
-    def parse(self, downloaded_file):
+    destination = "lists/official/it/bofh.csv"
+
+    def make_item(self, row):
+        notes = None
+        if len(row) > 4:
+            notes = row[4]
+        return {
+            "date_added": row[0],
+            "url": row[1],
+            "authority": row[3],
+            "category_code": map_category(row[2]),
+            "category_it_name": row[2],
+            "notes": notes
+        }
+
+    def parse_chunks(self, chunks):
         logging.info("Parsing BOFH list")
         parser = BOFHParser()
-        parser.feed(''.join(downloaded_file.readlines()))
+        for text in decode(chunks, self.encoding):
+            parser.feed(text)
+            # Rows are handed over as soon as they are complete
+            for row in parser.items:
+                yield self.make_item(row)
+            del parser.items[:]
+        parser.close()
         for row in parser.items:
-            notes = None
-            if len(row) > 4:
-                notes = row[4]
-            item = {
-                "date_added": row[0],
-                "url": row[1],
-                "authority": row[3],
-                "category_code": map_category(row[2]),
-                "category_it_name": row[2],
-                "notes": notes
-            }
-            yield item
+            yield self.make_item(row)
 
 
 def update(skip_download=False):
-    bofh_block_list = BOFHBlockList('lists/official/it/bofh.csv')
+    bofh_block_list = BOFHBlockList()
     bofh_block_list.update(skip_download)
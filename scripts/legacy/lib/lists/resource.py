@@ -1,10 +1,17 @@
 import os
 import csv
+import glob
+import json
 import shutil
+import hashlib
 import logging
+import urllib.error
+
+from contextlib import contextmanager
 
 from datetime import datetime
 from lists import https
+from lists.stream import read_chunks, prefetch, tee, digest, iter_lines
 
 
 class AlreadyPresent(Exception):
@@ -25,49 +32,94 @@ class Resource(object):
     key = "notes"
 
     download_url = None
+    encoding = "utf-8"
+    # Where the entries are written by default, relative to the root of
+    # the repository
+    destination = "services.csv"
+    # Seconds to wait for the server before giving up on the source
+    timeout = 60
 
-    def __init__(self, dst_file_name="services.csv"):
-        self.dst_file_name = dst_file_name
+    def __init__(self, dst_file_name=None):
+        self.dst_file_name = dst_file_name or self.destination
 
     def write_header(self):
         if not os.path.isfile(self.dst_file_name):
-            with open(self.dst_file_name, 'w') as f:
+            with open(self.dst_file_name, 'w', newline='') as f:
                 writer = csv.writer(f, delimiter=',', quotechar='"')
-                writer.writerow([x[0] for x in ["name"] + self.columns])
+                writer.writerow([x[0] for x in self.columns])
 
-    def already_present(self, item):
-        if self.key not in item.keys():
-            return False
+    def key_position(self):
         for idx, c in enumerate(self.columns):
             if c[0] == self.key:
-                break
+                return idx
+        return None
 
-        with open(self.dst_file_name, 'rb') as csvfile:
+    def load_keys(self):
+        """
+        Returns the set of keys already present in the destination file.
+        """
+        keys = set()
+        position = self.key_position()
+        if position is None or not os.path.isfile(self.dst_file_name):
+            return keys
+        with open(self.dst_file_name, newline='') as csvfile:
             reader = csv.reader(csvfile, delimiter=',')
-            reader.next()
+            next(reader, None)
             for row in reader:
-                if row[idx] == item[self.key]:
-                    return True
-        return False
+                if len(row) > position:
+                    keys.add(row[position])
+        return keys
 
-    def write_row(self, item):
-        if self.already_present(item):
-            raise AlreadyPresent
+    def already_present(self, item):
+        if self.key not in item.keys():
+            return False
+        return item[self.key] in self.load_keys()
 
-        row = [self.name]
+    def make_row(self, item):
+        row = []
         for column in self.columns:
             if column[0] in item.keys():
                 row.append(item[column[0]])
             else:
                 row.append(column[1])
+        return row
 
-        with open(self.dst_file_name, 'ab') as f:
+    def write_row(self, item):
+        if self.already_present(item):
+            raise AlreadyPresent
+
+        with open(self.dst_file_name, 'a', newline='') as f:
+            writer = csv.writer(f, delimiter=',')
+            writer.writerow(self.make_row(item))
+
+    def write_rows(self, items):
+        """
+        Appends the items that are not already present to the destination
+        file, reading it only once and keeping it open while writing.
+        Returns the number of items added and skipped.
+        """
+        keys = self.load_keys()
+        added = 0
+        skipped = 0
+        with open(self.dst_file_name, 'a', newline='') as f:
             writer = csv.writer(f, delimiter=',')
-            writer.writerow(row)
+            for item in items:
+                key = item.get(self.key)
+                if key is not None and key in keys:
+                    logging.info("Item %s already present" % item)
+                    skipped += 1
+                    continue
+                writer.writerow(self.make_row(item))
+                if key is not None:
+                    keys.add(key)
+                added += 1
+        return added, skipped
 
     @property
     def dst_filename(self):
-        timestamp = datetime.now().strftime("%Y-%m-%dT%H%M%SZ")
+        # With the microseconds, two updates within the same second do not
+        # overwrite each other's download. Names still sort chronologically.
+        timestamp = datetime.now().strftime("%Y-%m-%dT%H%M%S.%fZ")
         dst_filename = "%s-%s.dat" % (os.path.basename(self.name),
                                       timestamp)
         return os.path.join(self.dst_directory, dst_filename)
@@ -79,39 +131,210 @@ class Resource(object):
             os.path.dirname(self.name)
         )
 
-    def download(self, url=None, dst_filename=None):
-        if self.download_url is None and url is None:
-            return
+    def latest_download(self):
+        """
+        Returns the path of the most recent download of this resource.
+        """
+        pattern = os.path.join(self.dst_directory,
+                               "%s-*.dat" % os.path.basename(self.name))
+        # The timestamps in the file names sort chronologically
+        downloads = sorted(glob.glob(pattern))
+        if not downloads:
+            raise IOError("No downloaded file for %s in %s" % (
+                self.name, self.dst_directory))
+        return downloads[-1]
+
+    @property
+    def state_filename(self):
+        return os.path.join(self.dst_directory,
+                            "%s.state.json" % os.path.basename(self.name))
+
+    def load_state(self):
+        """
+        Returns what is known about the last version of the source that
+        was parsed: its URL, ETag, Last-Modified, SHA-256 and the keys of
+        its entries.
+        """
+        try:
+            with open(self.state_filename) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
 
+    def save_state(self, state):
+        os.makedirs(self.dst_directory, exist_ok=True)
+        with open(self.state_filename + ".tmp", "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(self.state_filename + ".tmp", self.state_filename)
+
+    def fetch(self, url=None, state=None):
+        """
+        Requests url, only if it changed since the version described by
+        state. Returns the response, or None if the server answered that
+        it did not change.
+        """
+        if url is None:
+            url = self.download_url
+        headers = {}
+        if state and state.get("url") == url:
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+        try:
+            return https.open(url, headers, self.timeout)
+        except urllib.error.HTTPError as exc:
+            if exc.code == 304:
+                return None
+            raise
+
+    def download(self, response, dst_filename=None):
+        """
+        Yields the data of response in chunks as it is received, while
+        also saving it to dst_filename.
+        """
         if dst_filename is None:
             dst_filename = self.dst_filename
 
+        os.makedirs(os.path.dirname(dst_filename), exist_ok=True)
+
         try:
-            os.makedirs(self.dst_directory)
-        except OSError as exc:
-            if exc.errno != 17:
-                raise exc
-
-        downloaded_file = open(dst_filename, "w+")
-        result = https.open(self.download_url)
-        shutil.copyfileobj(result, downloaded_file)
-        downloaded_file.seek(0)
-        return downloaded_file
-
-    def parse(self, downloaded_file):
-        for line in downloaded_file:
+            # Incomplete downloads are never picked by latest_download()
+            with open(dst_filename + ".part", "wb") as downloaded_file:
+                for chunk in tee(read_chunks(response), downloaded_file):
+                    yield chunk
+        finally:
+            response.close()
+        os.replace(dst_filename + ".part", dst_filename)
+
+    def read_download(self, dst_filename=None):
+        if dst_filename is None:
+            dst_filename = self.latest_download()
+        logging.info("Reading %s" % dst_filename)
+        with open(dst_filename, "rb") as downloaded_file:
+            for chunk in read_chunks(downloaded_file):
+                yield chunk
+
+    def parse_chunks(self, chunks):
+        """
+        Parses the downloaded data from an iterator over its chunks. By
+        default parse() is given the lines of the data.
+        """
+        return self.parse(iter_lines(chunks, self.encoding))
+
+    def parse(self, lines):
+        for line in lines:
             yield {"notes": line.strip()}
 
+    @contextmanager
+    def staged(self):
+        """
+        Makes the writes to the destination file go to a copy of it, which
+        only replaces it if they all succeed.
+        """
+        dst_file_name = self.dst_file_name
+        staged_file_name = dst_file_name + ".tmp"
+        if os.path.isfile(dst_file_name):
+            shutil.copyfile(dst_file_name, staged_file_name)
+        self.dst_file_name = staged_file_name
+        try:
+            yield
+            os.replace(staged_file_name, dst_file_name)
+        finally:
+            self.dst_file_name = dst_file_name
+            if os.path.exists(staged_file_name):
+                os.remove(staged_file_name)
+
+    def write_diff(self, diff, dst_filename):
+        diff_filename = os.path.splitext(dst_filename)[0] + ".diff.json"
+        with open(diff_filename, "w") as f:
+            json.dump(diff, f, indent=2, sort_keys=True)
+        logging.info("Wrote the changes to %s" % diff_filename)
+
     def update(self, skip_download=False):
-        self.write_header()
+        """
+        Adds the new entries of the source to the destination file.
+
+        Nothing is parsed when the server answers that the source did not
+        change, or when the last download has already been parsed.
+        Otherwise returns the keys of the entries that were added to and
+        removed from the source since it was last parsed.
+        """
+        state = {}
+        if os.path.isfile(self.dst_file_name):
+            # Without the destination file everything has to be parsed
+            state = self.load_state()
+
         if skip_download:
-            downloaded_file = open(os.path.join(self.dst_directory,
-                                                self.dst_filename))
+            dst_filename = self.latest_download()
+            with open(dst_filename, "rb") as f:
+                sha256 = hashlib.sha256()
+                for chunk in read_chunks(f):
+                    sha256.update(chunk)
+            if sha256.hexdigest() == state.get("sha256"):
+                logging.info("%s has not changed" % self.name)
+                return None
+            new_state = dict(state)
+            chunks = self.read_download(dst_filename)
         else:
-            downloaded_file = self.download()
-        for item in self.parse(downloaded_file):
-            try:
-                self.write_row(item)
-            except AlreadyPresent:
-                logging.info("Item %s already present" % item)
-        downloaded_file.close()
+            url = self.download_url
+            response = self.fetch(url, state)
+            if response is None:
+                logging.info("%s has not changed" % self.name)
+                return None
+            dst_filename = self.dst_filename
+            new_state = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }
+            # The data is received in another thread while it is parsed
+            chunks = prefetch(self.download(response, dst_filename))
+
+        sha256 = hashlib.sha256()
+        keys = set()
+
+        def collect_keys(items):
+            for item in items:
+                if item.get(self.key) is not None:
+                    keys.add(item[self.key])
+                yield item
+
+        # Rows are written while the data is still being downloaded
+        chunks = digest(chunks, sha256)
+        with self.staged():
+            self.write_header()
+            added, skipped = self.write_rows(collect_keys(self.parse_chunks(chunks)))
+            # Parsers can stop before the end of the data, which still has
+            # to be hashed and saved
+            for _ in chunks:
+                pass
+        logging.info("Added %d items, %d already present" % (added, skipped))
+
+        old_keys = set(state.get("keys", []))
+        diff = {
+            "source": self.name,
+            "sha256": sha256.hexdigest(),
+            "added": sorted(keys - old_keys),
+            "removed": sorted(old_keys - keys)
+        }
+        if diff["sha256"] == state.get("sha256"):
+            # The server does not support conditional requests, only its
+            # validators are kept
+            logging.info("%s has not changed" % self.name)
+            os.remove(dst_filename)
+            state.update(new_state)
+            self.save_state(state)
+            return None
+
+        new_state.update({
+            "sha256": diff["sha256"],
+            "download": dst_filename,
+            "keys": sorted(keys)
+        })
+        self.save_state(new_state)
+        logging.info("%d entries added to %s, %d removed" % (
+            len(diff["added"]), self.name, len(diff["removed"])))
+        if diff["added"] or diff["removed"]:
+            self.write_diff(diff, dst_filename)
+        return diff
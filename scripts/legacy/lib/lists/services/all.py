@@ -1,5 +1,5 @@
 from lists.services.tor import bridges
 
 
-def update(skip_update=False):
-    bridges.update(skip_update)
+def update(skip_download=False):
+    bridges.update(skip_download)
@@ -3,9 +3,10 @@ import csv
 import shutil
 import logging
 
+from contextlib import contextmanager
 from datetime import datetime
-from tempfile import TemporaryFile
 from lists import https
+from lists.stream import read_chunks, prefetch, iter_lines
 
 
 class AlreadyPresent(Exception):
@@ -26,65 +27,132 @@ class Service(object):
     key = "notes"
 
     download_url = None
+    encoding = "utf-8"
+    destination = "services.csv"
+    timeout = 60
 
-    def __init__(self, dst_file_name="services.csv"):
-        self.dst_file_name = dst_file_name
+    def __init__(self, dst_file_name=None):
+        self.dst_file_name = dst_file_name or self.destination
 
     def write_header(self):
         if not os.path.isfile(self.dst_file_name):
-            with open(self.dst_file_name, 'w') as f:
+            with open(self.dst_file_name, 'w', newline='') as f:
                 writer = csv.writer(f, delimiter=',', quotechar='"')
                 writer.writerow([x[0] for x in self.columns])
 
-    def already_present(self, item):
-        if self.key not in item.keys():
-            return False
+    def key_position(self):
         for idx, c in enumerate(self.columns):
             if c[0] == self.key:
-                break
-
-        with open(self.dst_file_name, 'rb') as csvfile:
+                return idx
+        return None
+
+    def load_keys(self):
+        """
+        Returns the set of keys already present in the destination file.
+        """
+        keys = set()
+        position = self.key_position()
+        if position is None or not os.path.isfile(self.dst_file_name):
+            return keys
+        with open(self.dst_file_name, newline='') as csvfile:
             reader = csv.reader(csvfile, delimiter=',')
-            reader.next()
+            next(reader, None)
             for row in reader:
-                if row[idx] == item[self.key]:
-                    return True
-        return False
+                if len(row) > position:
+                    keys.add(row[position])
+        return keys
 
-    def write_row(self, item):
-        if self.already_present(item):
-            raise AlreadyPresent
+    def already_present(self, item):
+        if self.key not in item.keys():
+            return False
+        return item[self.key] in self.load_keys()
 
+    def make_row(self, item):
         row = []
         for column in self.columns:
             if column[0] in item.keys():
                 row.append(item[column[0]])
             else:
                 row.append(column[1])
+        return row
+
+    def write_row(self, item):
+        if self.already_present(item):
+            raise AlreadyPresent
 
-        with open(self.dst_file_name, 'ab') as f:
+        with open(self.dst_file_name, 'a', newline='') as f:
+            writer = csv.writer(f, delimiter=',')
+            writer.writerow(self.make_row(item))
+
+    def write_rows(self, items):
+        """
+        Appends the items that are not already present to the destination
+        file, reading it only once and keeping it open while writing.
+        Returns the number of items added and skipped.
+        """
+        keys = self.load_keys()
+        added = 0
+        skipped = 0
+        with open(self.dst_file_name, 'a', newline='') as f:
             writer = csv.writer(f, delimiter=',')
-            writer.writerow(row)
+            for item in items:
+                key = item.get(self.key)
+                if key is not None and key in keys:
+                    logging.info("Item %s already present" % item)
+                    skipped += 1
+                    continue
+                writer.writerow(self.make_row(item))
+                if key is not None:
+                    keys.add(key)
+                added += 1
+        return added, skipped
 
     def download(self, url=None):
-        if self.download_url is None and url is None:
+        """
+        Yields the downloaded data in chunks as it is received.
+        """
+        if url is None:
+            url = self.download_url
+        if url is None:
             return
 
-        downloaded_file = TemporaryFile()
-        result = https.open(self.download_url)
-        shutil.copyfileobj(result, downloaded_file)
-        downloaded_file.seek(0)
-        return downloaded_file
+        result = https.open(url, timeout=self.timeout)
+        try:
+            for chunk in read_chunks(result):
+                yield chunk
+        finally:
+            result.close()
 
-    def parse(self, downloaded_file):
-        for line in downloaded_file:
+    def parse_chunks(self, chunks):
+        return self.parse(iter_lines(chunks, self.encoding))
+
+    def parse(self, lines):
+        for line in lines:
             yield {"notes": line.strip()}
 
+    @contextmanager
+    def staged(self):
+        """
+        Makes the writes to the destination file go to a copy of it, which
+        only replaces it if they all succeed.
+        """
+        dst_file_name = self.dst_file_name
+        staged_file_name = dst_file_name + ".tmp"
+        if os.path.isfile(dst_file_name):
+            shutil.copyfile(dst_file_name, staged_file_name)
+        self.dst_file_name = staged_file_name
+        try:
+            yield
+            os.replace(staged_file_name, dst_file_name)
+        finally:
+            self.dst_file_name = dst_file_name
+            if os.path.exists(staged_file_name):
+                os.remove(staged_file_name)
+
     def update(self):
-        self.write_header()
-        downloaded_file = self.download()
-        for item in self.parse(downloaded_file):
-            try:
-                self.write_row(item)
-            except AlreadyPresent:
-                logging.info("Item %s already present" % item)
+        with self.staged():
+            self.write_header()
+            # The data is received in another thread while it is parsed
+            chunks = prefetch(self.download())
+            added, skipped = self.write_rows(self.parse_chunks(chunks))
+        logging.info("Added %d items, %d already present" % (added, skipped))
@@ -27,9 +27,10 @@ class TorBrowserBridges(Bridges):
     name = "services/tor/bridges"
     key = "address"
     download_url = "https://gitweb.torproject.org/builders/tor-browser-bundle.git/plain/Bundle-Data/PTConfigs/bridge_prefs.js"
+    destination = "lists/services/tor/bridges.csv"
 
-    def parse(self, downloaded_file):
-        for line in downloaded_file:
+    def parse(self, lines):
+        for line in lines:
             line = line.strip()
             if not line.startswith('pref("extensions.torlauncher.default_bridge.'):
                 continue
@@ -43,7 +44,7 @@ class TorBrowserBridges(Bridges):
 
             if transport_name not in ["meek", "flashproxy"]:
                 item["fingerprint"] = parts[2]
-                fingerprint = item["fingerprint"].decode('hex')
+                fingerprint = bytes.fromhex(item["fingerprint"])
                 item["hashed_fingerprint"] = sha1(fingerprint).hexdigest()
 
             item["address"] = address
@@ -51,6 +52,6 @@ class TorBrowserBridges(Bridges):
             yield item
 
 
-def update():
-    tor_browser_bridges = TorBrowserBridges('lists/services/tor/bridges.csv')
-    tor_browser_bridges.update()
+def update(skip_download=False):
+    tor_browser_bridges = TorBrowserBridges()
+    tor_browser_bridges.update(skip_download)
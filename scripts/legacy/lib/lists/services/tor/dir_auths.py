@@ -23,15 +23,16 @@ class DirectoryAuthority(Resource):
     name = "tor/dir_auths"
     key = "address"
     download_url = "https://gitweb.torproject.org/tor.git/plain/src/or/config.c"
+    destination = "lists/services/tor/dir_auths.csv"
 
-    def parse(self, downloaded_file):
+    def parse(self, lines):
         raw_lines = []
         dir_auths = []
         new_dir = ""
         found_line = False
         signature = "static const char *default_authorities[] = {"
 
-        for line in downloaded_file:
+        for line in lines:
             line = line.strip()
             if line != signature and not found_line:
                 continue
@@ -81,6 +82,6 @@ def isgoodipv4(s):
     try: return all(0<=int(p)<256 for p in pieces)
     except ValueError: return False
 
-def update():
-    tor_directory_authorities = DirectoryAuthority("lists/services/tor/dir_auths.csv")
-    tor_directory_authorities.update()
+def update(skip_download=False):
+    tor_directory_authorities = DirectoryAuthority()
+    tor_directory_authorities.update(skip_download)
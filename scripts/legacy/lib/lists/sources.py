@@ -0,0 +1,155 @@
+"""
+Finds every source of the official and services lists and updates them
+all at once.
+"""
+import os
+import time
+import logging
+import pkgutil
+import importlib
+import multiprocessing
+import multiprocessing.connection
+
+from collections import deque
+
+import lists
+from lists.resource import Resource
+from lists.services.base import Service
+
+
+def subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        for subsubclass in subclasses(subclass):
+            yield subsubclass
+
+
+def find_sources():
+    """
+    Returns every Resource and Service class that can be downloaded,
+    importing all the modules of the lists package to find them.
+    """
+    for module_info in pkgutil.walk_packages(lists.__path__, "lists."):
+        importlib.import_module(module_info.name)
+    sources = []
+    for base in (Resource, Service):
+        for cls in subclasses(base):
+            if cls.download_url is not None and cls not in sources:
+                sources.append(cls)
+    return sources
+
+
+def update_source(cls, skip_download=False, timeout=None):
+    source = cls()
+    if timeout is not None:
+        source.timeout = timeout
+    if isinstance(source, Resource):
+        return source.update(skip_download)
+    return source.update()
+
+
+def source_name(cls):
+    return getattr(cls, "name", cls.__name__)
+
+
+def run_source(cls, skip_download, timeout, conn):
+    """
+    Updates one source in its own process and sends back its result and
+    error through conn.
+    """
+    result = None
+    error = None
+    try:
+        result = update_source(cls, skip_download, timeout)
+    except Exception as exc:
+        logging.exception("Failed to update %s" % source_name(cls))
+        error = "%s: %s" % (exc.__class__.__name__, exc)
+    conn.send((result, error))
+    conn.close()
+
+
+class SourceProcess(object):
+    def __init__(self, cls, skip_download, timeout, deadline):
+        self.cls = cls
+        self.conn, child_conn = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(
+            target=run_source, args=(cls, skip_download, timeout, child_conn))
+        self.process.start()
+        child_conn.close()
+        self.start = time.monotonic()
+        self.deadline = self.start + deadline if deadline else None
+
+    def finish(self):
+        """
+        Returns the result and error of the source, once its process
+        exited or sent them.
+        """
+        try:
+            result, error = self.conn.recv()
+        except EOFError:
+            result, error = None, "exited with code %s" % self.process.exitcode
+        self.process.join()
+        self.conn.close()
+        return result, error
+
+    def kill(self):
+        # Its staged copy and partial download are left behind, and are
+        # ignored or replaced by the next update of the destination
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def update_all(sources, skip_download=False, timeout=None, jobs=None,
+               deadline=None):
+    """
+    Updates the sources concurrently, each in its own process, and yields
+    the name, result, error and duration of each as soon as it is done.
+
+    The sources that write to the same destination file are updated one
+    after the other. A source still running deadline seconds after it was
+    started is stopped and reported as failed.
+    """
+    pending = {}
+    for cls in sources:
+        pending.setdefault(cls.destination, deque()).append(cls)
+    jobs = jobs or os.cpu_count() or 1
+    running = {}
+    try:
+        while pending or running:
+            for destination in list(pending):
+                if len(running) >= jobs:
+                    break
+                if destination in running:
+                    continue
+                classes = pending[destination]
+                running[destination] = SourceProcess(classes.popleft(),
+                                                     skip_download, timeout,
+                                                     deadline)
+                if not classes:
+                    del pending[destination]
+
+            now = time.monotonic()
+            deadlines = [r.deadline for r in running.values() if r.deadline]
+            wait_for = max(0, min(deadlines) - now) if deadlines else None
+            ready = set(multiprocessing.connection.wait(
+                [r.conn for r in running.values()] +
+                [r.process.sentinel for r in running.values()], wait_for))
+
+            now = time.monotonic()
+            for destination, r in list(running.items()):
+                if r.conn in ready or r.process.sentinel in ready:
+                    result, error = r.finish()
+                elif r.deadline is not None and now >= r.deadline:
+                    logging.error("Stopping %s after %ds" % (
+                        source_name(r.cls), deadline))
+                    r.kill()
+                    result, error = None, "timed out after %ds" % deadline
+                else:
+                    continue
+                del running[destination]
+                yield source_name(r.cls), result, error, now - r.start
+    finally:
+        # Only left running when the caller stopped early
+        for r in running.values():
+            r.kill()
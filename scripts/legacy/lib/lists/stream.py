@@ -0,0 +1,108 @@
+"""
+Helpers to parse downloads while they are being received, so that a
+whole file never has to be held in memory.
+"""
+import queue
+import codecs
+import threading
+
+CHUNK_SIZE = 64 * 1024
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def prefetch(chunks, depth=16):
+    """
+    Reads chunks in a background thread, up to depth chunks ahead of the
+    consumer, so that receiving the data overlaps with parsing it. Errors
+    raised while reading are raised again to the consumer.
+    """
+    items = queue.Queue(depth)
+    stop = threading.Event()
+
+    def put(item):
+        # Gives up when the consumer went away instead of blocking forever
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put((chunk, None)):
+                    return
+            put((None, None))
+        except BaseException as exc:
+            put((None, exc))
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk, exc = items.get()
+            if exc is not None:
+                raise exc
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        stop.set()
+        producer.join()
+
+
+def tee(chunks, out_file):
+    """
+    Writes every chunk to out_file before passing it on.
+    """
+    for chunk in chunks:
+        out_file.write(chunk)
+        yield chunk
+
+
+def digest(chunks, hash_object):
+    """
+    Updates hash_object with every chunk before passing it on.
+    """
+    for chunk in chunks:
+        hash_object.update(chunk)
+        yield chunk
+
+
+def decode(chunks, encoding="utf-8"):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def iter_lines(chunks, encoding="utf-8"):
+    """
+    Yields the lines of the decoded chunks, keeping their line endings
+    like iterating over a file does.
+    """
+    pending = ""
+    for text in decode(chunks, encoding):
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Serves testlists.lookup over HTTP, reloading the index whenever one of
+# the lists changes.
+#
+#   GET /lookup?url=https://example.com/page   entries of the URL and host
+#   GET /lookup?host=example.com               entries of the host
+#   GET /metrics                               p50/p99 latency, query rate
+#
+# $ python scripts/lookup-server.py lists/ --port 8080
+
+import json
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from testlists.lookup import Lookup
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    # Keep the connections of the clients open between queries
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are sent separately, which Nagle's
+    # algorithm would delay until the client acknowledges the headers
+    disable_nagle_algorithm = True
+
+    def send_json(self, status, body):
+        data = json.dumps(body, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == '/lookup':
+            params = parse_qs(parts.query)
+            query = (params.get('url') or params.get('host') or [None])[0]
+            if not query:
+                self.send_json(400, {'error': 'missing url or host parameter'})
+                return
+            self.send_json(200, self.server.lookup.lookup(query))
+        elif parts.path == '/metrics':
+            self.send_json(200, self.server.lookup.status())
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def main(lists_path, host, port, reload_interval, verbose=False):
+    lookup = Lookup(lists_path, reload_interval=reload_interval)
+    server = ThreadingHTTPServer((host, port), LookupHandler)
+    server.daemon_threads = True
+    server.lookup = lookup
+    server.verbose = verbose
+    print('Serving {} hosts from {} on http://{}:{}/'.format(
+        len(lookup.index.hosts), lists_path, host, server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        lookup.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve lookups in the test lists over HTTP')
+    parser.add_argument('lists_path', metavar='LISTS_PATH', nargs='?', default='lists',
+                        help='path to the test list')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='port to listen on, 0 for any free port')
+    parser.add_argument('--reload-interval', type=float, default=2.0,
+                        help='seconds between two checks for changed lists, 0 to never reload')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log every request')
+    args = parser.parse_args()
+    main(args.lists_path, args.host, args.port, args.reload_interval,
+         verbose=args.verbose)
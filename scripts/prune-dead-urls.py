@@ -1,85 +1,372 @@
 import argparse
+import asyncio
 import datetime
+import json
 import random
 import os
 import re
 import sys
 import csv
 import time
-from glob import glob
-from urllib.parse import urlparse
+import sqlite3
 
 import socket
+import itertools
 import concurrent.futures
 
-def prune_dead_urls(csv_path, failed_domains):
+from testlists import corpus, http_probe
+
+def prune_dead_urls(csv_path, row_domains, failed_domains):
+    # Files without any failed domain are left alone, so that their mtime
+    # does not change.
+    if failed_domains.isdisjoint(row_domains):
+        return False
     with open(csv_path, 'r') as in_file, \
          open(csv_path + '.tmp', 'w') as out_file:
         reader = csv.reader(in_file, delimiter=',')
         writer = csv.writer(out_file, delimiter=',', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
         writer.writerow(next(reader))
-        for idx, row in enumerate(reader):
-            url = row[0]
-            domain = urlparse(url).netloc.split(':')[0]
+        # Rows added to the file since row_domains was computed have no
+        # domain and are kept
+        for row, domain in itertools.zip_longest(reader, row_domains):
+            if row is None:
+                break
             if domain in failed_domains:
                 continue
             writer.writerow(row)
     os.rename(csv_path + '.tmp', csv_path)
+    return True
+
+STATUS_OK = "ok"
+STATUS_NXDOMAIN = "nxdomain"
+# The name exists but has no address records
+STATUS_NODATA = "nodata"
+STATUS_ERROR = "error"
+
+GAIERROR_STATUSES = dict(
+    (getattr(socket, name), status)
+    for name, status in (("EAI_NONAME", STATUS_NXDOMAIN),
+                         ("EAI_NODATA", STATUS_NODATA))
+    if hasattr(socket, name)
+)
+
+def getaddrinfo(domain):
+    socket.getaddrinfo(domain, 0)
 
-def resolve_domain(domain, idx, start_time):
-    delta = time.time() - start_time
+async def resolve_domain(domain, idx, start_time, resolve, executor, timeout):
+    loop = asyncio.get_running_loop()
     try:
-        socket.getaddrinfo(domain, 0)
+        await asyncio.wait_for(
+            loop.run_in_executor(executor, resolve, domain),
+            timeout
+        )
+        delta = time.time() - start_time
         print(f"resolving {domain} ({idx} - {delta}) ✓")
-        return True
-    except socket.gaierror:
+        return STATUS_OK
+    except socket.gaierror as exc:
+        delta = time.time() - start_time
         print(f"resolving {domain} ({idx} - {delta}) ✗")
-        return False
+        return GAIERROR_STATUSES.get(exc.errno, STATUS_ERROR)
+    except asyncio.TimeoutError:
+        delta = time.time() - start_time
+        print(f"timeout resolving {domain} ({idx} - {delta}) ✗")
+        return STATUS_ERROR
     except Exception as exc:
+        delta = time.time() - start_time
         print(f"other failure in {domain} ({idx} - {delta}) ✗")
         print(exc)
-        return False
+        return STATUS_ERROR
 
-def get_failed_domains(domain_list):
+async def resolve_domains(domain_list, resolve, concurrency, timeout, record):
     start_time = time.time()
-    failed_domains = set()
-    for idx, domain in enumerate(domain_list):
-        if resolve_domain(domain, idx, start_time) == False:
-            failed_domains.add(domain)
-    return failed_domains
-
-def main(lists_path):
-    domain_set = set()
-    url_lists = []
-    for csv_path in glob(os.path.join(lists_path, "*")):
-        if os.path.basename(csv_path).startswith('00-') or \
-                os.path.basename(csv_path).startswith('official'):
+    semaphore = asyncio.Semaphore(concurrency)
+    # getaddrinfo cannot be cancelled, so a lookup that timed out keeps its
+    # thread busy until it returns. The extra workers keep those from
+    # starving the other lookups.
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency*2)
+
+    async def bounded_resolve(idx, domain):
+        async with semaphore:
+            status = await resolve_domain(domain, idx, start_time, resolve,
+                                          executor, timeout)
+        if record is not None:
+            record(domain, status)
+        return status
+    try:
+        return await asyncio.gather(*[
+            bounded_resolve(idx, domain)
+            for idx, domain in enumerate(domain_list)
+        ])
+    finally:
+        executor.shutdown(wait=False)
+
+def get_failed_domains(domain_list, resolve=getaddrinfo, concurrency=64,
+                       timeout=10, record=None):
+    """
+    Resolves every domain in domain_list, running up to concurrency lookups
+    at the same time, and returns the set of domains that failed to resolve
+    or did not resolve within timeout seconds.
+
+    resolve is called with the domain from a worker thread and should raise
+    socket.gaierror when the domain does not resolve. When given, record is
+    called with the domain and its status as soon as each lookup is done.
+    """
+    results = asyncio.run(
+        resolve_domains(domain_list, resolve, concurrency, timeout, record)
+    )
+    return set(
+        domain for domain, status in zip(domain_list, results)
+        if status != STATUS_OK
+    )
+
+class ProbeStore(object):
+    """
+    Keeps the outcome of the DNS lookups in a SQLite database, so that an
+    interrupted run can be resumed and lookups done less than ttl seconds
+    ago are not done again.
+
+    Every domain has the status of the first pass and of the retry done
+    in the second pass. The retry status is reset whenever the domain is
+    probed again in the first pass.
+    """
+    def __init__(self, path=":memory:", ttl=86400):
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS probes (
+                domain TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                checked_at REAL NOT NULL,
+                retry_status TEXT,
+                retried_at REAL
+            );
+            CREATE TEMP TABLE run_domains (domain TEXT PRIMARY KEY);
+        """)
+        self.pending = 0
+
+    def set_run_domains(self, domains):
+        self.conn.execute("DELETE FROM run_domains")
+        self.conn.executemany("INSERT INTO run_domains VALUES (?)",
+                              ((d,) for d in domains))
+
+    def _select(self, where, params=()):
+        return [row[0] for row in self.conn.execute(
+            "SELECT run_domains.domain FROM run_domains "
+            "LEFT JOIN probes ON probes.domain = run_domains.domain "
+            "WHERE " + where, params
+        )]
+
+    def stale_domains(self):
+        return self._select("probes.checked_at IS NULL OR probes.checked_at < ?",
+                            (time.time() - self.ttl,))
+
+    def retry_candidates(self):
+        return self._select("probes.status != ? AND probes.retry_status IS NULL",
+                            (STATUS_OK,))
+
+    def failed_domains(self):
+        return set(self._select("probes.status != ? AND probes.retry_status != ?",
+                                (STATUS_OK, STATUS_OK)))
+
+    def schroedinger_domains(self):
+        return set(self._select("probes.status != ? AND probes.retry_status = ?",
+                                (STATUS_OK, STATUS_OK)))
+
+    def fresh_status(self, domain):
+        """
+        Returns the status of domain if it was probed less than ttl seconds
+        ago, None otherwise.
+        """
+        row = self.conn.execute(
+            "SELECT status FROM probes WHERE domain = ? AND checked_at >= ?",
+            (domain, time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _maybe_commit(self):
+        self.pending += 1
+        if self.pending >= 100:
+            self.commit()
+
+    def record(self, domain, status):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO probes (domain, status, checked_at) "
+            "VALUES (?, ?, ?)", (domain, status, time.time())
+        )
+        self._maybe_commit()
+
+    def record_retry(self, domain, status):
+        self.conn.execute(
+            "UPDATE probes SET retry_status = ?, retried_at = ? "
+            "WHERE domain = ?", (status, time.time(), domain)
+        )
+        self._maybe_commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+# Second level domains under which ccTLDs register names, as in co.uk
+SECOND_LEVEL_LABELS = set([
+    "ac", "co", "com", "edu", "gob", "go", "gov", "ltd", "mil", "ne", "net",
+    "nic", "or", "org", "plc", "sch"
+])
+
+def is_ip_address(host):
+    try:
+        socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+        return True
+    except (OSError, ValueError):
+        return False
+
+def registrable_domain(host):
+    """
+    Returns the domain under which host was registered, e.g. example.co.uk
+    for www.example.co.uk. This is an approximation of the public suffix
+    list that only knows about the common ccTLD second level domains.
+    """
+    if is_ip_address(host):
+        return host
+    labels = host.rstrip(".").lower().split(".")
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+def group_by_registrable_domain(domains):
+    groups = {}
+    for domain in domains:
+        groups.setdefault(registrable_domain(domain), []).append(domain)
+    return groups
+
+def probe_parents(domains, store, concurrency, timeout, resolve=getaddrinfo):
+    """
+    Probes the registrable domain of every group of at least two domains
+    and records all the domains of a group whose parent is NXDOMAIN as
+    NXDOMAIN, without probing them. Returns the domains that still need to
+    be probed.
+
+    Only a parent that does not exist (EAI_NONAME) has this effect: one
+    without address records (EAI_NODATA) often has live subdomains. Since
+    the domains recorded this way failed, they are all probed again one by
+    one in the second pass before anything is pruned.
+    """
+    groups = dict((parent, hosts)
+                  for parent, hosts in group_by_registrable_domain(domains).items()
+                  if len(hosts) > 1)
+    to_probe = [parent for parent in groups if store.fresh_status(parent) is None]
+    print(f"## Probing {len(to_probe)} parent domains of {len(groups)} groups ##")
+    get_failed_domains(to_probe, resolve=resolve, concurrency=concurrency,
+                       timeout=timeout, record=store.record)
+    store.commit()
+
+    skipped = set()
+    for parent, hosts in groups.items():
+        status = store.fresh_status(parent)
+        if status is not None and parent in hosts:
+            # The parent is also listed and was just probed as a host
+            skipped.add(parent)
+        if status != STATUS_NXDOMAIN:
             continue
-        with open(csv_path, 'r') as in_file:
-            reader = csv.reader(in_file, delimiter=',')
-            next(reader) # Skip header
-            for idx, row in enumerate(reader):
-                url = row[0]
-                domain = urlparse(url).netloc.split(':')[0]
-                domain_set.add(domain)
-        url_lists.append(csv_path)
-
-    failed_domains = get_failed_domains(list(domain_set))
+        for host in hosts:
+            store.record(host, STATUS_NXDOMAIN)
+            skipped.add(host)
+    store.commit()
+    print(f"## {len(skipped)} domains are under a NXDOMAIN parent or were "
+          "probed as one ##")
+    return [domain for domain in domains if domain not in skipped]
+
+def write_http_report(urls, report_path, concurrency, timeout, rate):
+    """
+    Checks the URLs over HTTP(S) and writes the results to report_path as
+    JSON Lines. Nothing is pruned based on them.
+    """
+    counts = {}
+    with open(report_path, 'w') as out_file:
+        for result in http_probe.check_urls(urls, concurrency=concurrency,
+                                            timeout=timeout, rate=rate):
+            out_file.write(json.dumps(result.to_dict()) + '\n')
+            counts[result.status] = counts.get(result.status, 0) + 1
+    print(f"HTTP results written to {report_path}: {counts}")
+
+def main(lists_path, concurrency=64, timeout=10, state_path=None, ttl=86400,
+         group_domains=True, http_report_path=None, http_concurrency=32,
+         http_rate=1, resolve=getaddrinfo):
+    lists = corpus.load(lists_path)
+    url_lists = [
+        (csv_path, lists.row_domains(country_code))
+        for country_code, csv_path in lists.paths.items()
+    ]
+
+    store = ProbeStore(state_path or ":memory:", ttl)
+    store.set_run_domains(lists.domains())
+    domains = store.stale_domains()
+    if group_domains:
+        domains = probe_parents(domains, store, concurrency, timeout,
+                                resolve=resolve)
+    get_failed_domains(domains,
+                       resolve=resolve,
+                       concurrency=concurrency,
+                       timeout=timeout,
+                       record=store.record)
+    store.commit()
     print("## Going for a second pass ##")
-    shuffled_domains = list(failed_domains)
+    shuffled_domains = store.retry_candidates()
     random.shuffle(shuffled_domains)
-    failed_domains_second_pass = get_failed_domains(shuffled_domains)
+    get_failed_domains(shuffled_domains,
+                       resolve=resolve,
+                       concurrency=concurrency,
+                       timeout=timeout,
+                       record=store.record_retry)
+    store.commit()
 
-    failed_domain_set = failed_domains.intersection(failed_domains_second_pass)
-    schroedinger_domains = failed_domains - failed_domains_second_pass
+    failed_domain_set = store.failed_domains()
+    schroedinger_domains = store.schroedinger_domains()
+    store.close()
     if len(schroedinger_domains) > 0:
         print(f"schroedinger domains {schroedinger_domains}")
 
-    for csv_path in url_lists:
-        prune_dead_urls(csv_path, failed_domain_set)
+    for csv_path, row_domains in url_lists:
+        if prune_dead_urls(csv_path, row_domains, failed_domain_set):
+            print(f"pruned {csv_path}")
+            lists.invalidate(corpus.get_country_code(csv_path))
+
+    if http_report_path:
+        urls = sorted(set(
+            row[0] for country_code in lists.country_codes
+            for row in lists.rows(country_code) if row
+        ))
+        write_http_report(urls, http_report_path, http_concurrency, timeout,
+                          http_rate)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Check if URLs in the test list are OK')
     parser.add_argument('lists_path', metavar='LISTS_PATH', help='path to the test list')
+    parser.add_argument('--concurrency', type=int, default=64,
+                        help='number of DNS lookups to run at the same time')
+    parser.add_argument('--timeout', type=float, default=10,
+                        help='seconds after which a lookup is considered failed')
+    parser.add_argument('--state', metavar='STATE_PATH', default=None,
+                        help='SQLite database where the lookup results are '
+                        'kept, so that interrupted runs can be resumed')
+    parser.add_argument('--ttl', type=float, default=86400,
+                        help='seconds for which a lookup result in the state '
+                        'database is reused')
+    parser.add_argument('--no-grouping', action='store_true',
+                        help='do not probe the registrable domain of related '
+                        'hosts first')
+    parser.add_argument('--http-report', metavar='REPORT_PATH', default=None,
+                        help='also check the remaining URLs over HTTP(S) and '
+                        'write the results to REPORT_PATH')
+    parser.add_argument('--http-concurrency', type=int, default=32,
+                        help='number of hosts checked over HTTP at the same time')
+    parser.add_argument('--http-rate', type=float, default=1,
+                        help='maximum number of HTTP requests per second to a host')
     args = parser.parse_args()
-    main(args.lists_path)
+    main(args.lists_path, concurrency=args.concurrency, timeout=args.timeout,
+         state_path=args.state, ttl=args.ttl, group_domains=not args.no_grouping,
+         http_report_path=args.http_report,
+         http_concurrency=args.http_concurrency, http_rate=args.http_rate)
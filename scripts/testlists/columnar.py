@@ -0,0 +1,349 @@
+"""
+Columnar export of the test lists, to filter and join them by URL,
+category, country and date without parsing the CSV files.
+
+Every column is a contiguous little-endian array:
+
+    url, notes              rows+1 x uint32 offsets, and the UTF-8 bytes
+                            of value i at data[off[i]:off[i+1]]
+    country, category_code  rows x uint16 codes into a dictionary
+    category_description,
+    source                  rows x uint32 codes into a dictionary
+    date_added              rows x int32 days since 1970-01-01, or
+                            MISSING_DATE when the date is not valid
+
+The file starts with MAGIC, a uint32 version and the uint32 length of a
+JSON header with the number of rows, the position of the columns, the
+dictionaries and the non-empty dates that are not valid, by row. Columns start on 8-byte boundaries, so that they can be
+memory-mapped as numpy arrays.
+
+numpy is optional. Without it the columns are memoryviews and select()
+goes through the rows in Python.
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from datetime import date
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from testlists import corpus
+from testlists.entry import EntryTable
+
+MAGIC = b'TLCOLS\0\0'
+VERSION = 2
+
+PREAMBLE = struct.Struct('<8sII')
+
+MISSING_DATE = -2**31
+EPOCH = date(1970, 1, 1).toordinal()
+
+STRING = 'string'
+# Column name and type, which is either STRING or an array typecode
+COLUMNS = [
+    ('url', STRING),
+    ('country', 'H'),
+    ('category_code', 'H'),
+    ('category_description', 'I'),
+    ('date_added', 'i'),
+    ('source', 'I'),
+    ('notes', STRING),
+]
+DICTIONARY_COLUMNS = ['country', 'category_code', 'category_description', 'source']
+
+NUMPY_DTYPES = {'H': '<u2', 'I': '<u4', 'i': '<i4'}
+
+def to_day(value):
+    """
+    Returns the day number of a date or of a YYYY-MM-DD string, or
+    MISSING_DATE if it is not a valid date.
+    """
+    if isinstance(value, date):
+        return value.toordinal() - EPOCH
+    try:
+        return date.fromisoformat(value).toordinal() - EPOCH
+    except (TypeError, ValueError):
+        return MISSING_DATE
+
+def to_filter_day(value):
+    """
+    Returns the day number of a date filter, raising ValueError if it is
+    not a valid date.
+    """
+    day = to_day(value)
+    if day == MISSING_DATE:
+        raise ValueError('Invalid date: {!r}'.format(value))
+    return day
+
+def from_day(day):
+    if day == MISSING_DATE:
+        return None
+    return date.fromordinal(day + EPOCH)
+
+def _little_endian(a):
+    if sys.byteorder != 'little':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+class StringColumn(object):
+    def __init__(self):
+        self.offsets = array('I', [0])
+        self.data = bytearray()
+
+    def append(self, value):
+        self.data += value.encode('utf-8')
+        if len(self.data) > 0xffffffff:
+            raise ValueError('String column larger than 4 GiB')
+        self.offsets.append(len(self.data))
+
+class ColumnarWriter(object):
+    def __init__(self):
+        self.rows = 0
+        self.dictionaries = dict((name, {}) for name in DICTIONARY_COLUMNS)
+        # The dates that are kept as they are, since they do not fit in
+        # date_added
+        self.invalid_dates = {}
+        self.columns = {}
+        for name, kind in COLUMNS:
+            self.columns[name] = StringColumn() if kind == STRING else array(kind)
+
+    def code(self, name, value):
+        dictionary = self.dictionaries[name]
+        if value not in dictionary:
+            dictionary[value] = len(dictionary)
+        return dictionary[value]
+
+    def add(self, country_code, entry):
+        columns = self.columns
+        columns['url'].append(entry.url)
+        columns['country'].append(self.code('country', country_code))
+        columns['category_code'].append(self.code('category_code', entry.category_code))
+        columns['category_description'].append(
+            self.code('category_description', entry.category_description))
+        day = to_day(entry.date_added)
+        if day == MISSING_DATE and entry.date_added:
+            self.invalid_dates[str(self.rows)] = entry.date_added
+        columns['date_added'].append(day)
+        columns['source'].append(self.code('source', entry.source))
+        columns['notes'].append(entry.notes)
+        self.rows += 1
+
+    def write(self, path):
+        # The header holds the position of the columns, which depends on
+        # the length of the header itself, so the columns are laid out
+        # relative to the end of the header first.
+        buffers = []
+        layout = {}
+        pos = 0
+        for name, kind in COLUMNS:
+            column = self.columns[name]
+            if kind == STRING:
+                parts = [('offsets', _little_endian(column.offsets)),
+                         ('data', bytes(column.data))]
+                layout[name] = {'type': STRING, 'size': len(column.data)}
+            else:
+                parts = [('offset', _little_endian(column))]
+                layout[name] = {'type': kind}
+            for key, data in parts:
+                pos += -pos % 8
+                layout[name][key] = pos
+                buffers.append((pos, data))
+                pos += len(data)
+
+        dictionaries = dict((name, list(values))
+                            for name, values in self.dictionaries.items())
+        header = {'rows': self.rows, 'columns': layout,
+                  'dictionaries': dictionaries,
+                  'invalid_dates': self.invalid_dates}
+        encoded = json.dumps(header, separators=(',', ':'),
+                             ensure_ascii=False).encode('utf-8')
+        start = PREAMBLE.size + len(encoded)
+        start += -start % 8
+
+        with open(path + '.tmp', 'wb') as out_file:
+            out_file.write(PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+            out_file.write(encoded)
+            out_file.write(b'\0' * (start - PREAMBLE.size - len(encoded)))
+            written = 0
+            for pos, data in buffers:
+                out_file.write(b'\0' * (pos - written))
+                out_file.write(data)
+                written = pos + len(data)
+        os.replace(path + '.tmp', path)
+
+def write_columns(lists_path, path, table=None):
+    """
+    Exports every list of lists_path to a columnar file in path and
+    returns the number of rows. The rows with the wrong number of columns
+    are skipped and added to table.invalid_rows.
+    """
+    writer = ColumnarWriter()
+    if table is None:
+        table = EntryTable()
+    lists = corpus.load(lists_path)
+    for country_code in lists.country_codes:
+        for entry in lists.entries(country_code, table):
+            writer.add(country_code, entry)
+    writer.write(path)
+    return writer.rows
+
+class InvalidColumns(Exception):
+    pass
+
+class Columns(object):
+    """
+    A memory-mapped columnar export.
+
+    column() returns numpy arrays when numpy is installed and memoryviews
+    otherwise. They point into the mapped file, so they have to be
+    released before close().
+    """
+    def __init__(self, path, use_numpy=True):
+        self.numpy = numpy if use_numpy else None
+        with open(path, 'rb') as in_file:
+            self._mmap = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        try:
+            magic, version, header_size = PREAMBLE.unpack_from(self._mmap, 0)
+            if magic != MAGIC or version != VERSION:
+                raise InvalidColumns(path)
+            header = json.loads(str(self._view[PREAMBLE.size:PREAMBLE.size+header_size], 'utf-8'))
+        except (struct.error, ValueError):
+            raise InvalidColumns(path)
+        start = PREAMBLE.size + header_size
+        self._start = start + (-start % 8)
+        self.rows = header['rows']
+        self._layout = header['columns']
+        self.dictionaries = header['dictionaries']
+        self._invalid_dates = header['invalid_dates']
+        self._codes = dict(
+            (name, dict((value, code) for code, value in enumerate(values)))
+            for name, values in self.dictionaries.items()
+        )
+        self._columns = {}
+
+    def _array(self, kind, pos, count):
+        start = self._start + pos
+        if self.numpy is not None:
+            return self.numpy.frombuffer(self._view, dtype=NUMPY_DTYPES[kind],
+                                         count=count, offset=start)
+        end = start + count * array(kind).itemsize
+        if sys.byteorder == 'little':
+            return self._view[start:end].cast(kind)
+        a = array(kind, self._view[start:end].tobytes())
+        a.byteswap()
+        return a
+
+    def column(self, name):
+        """
+        Returns the codes of a dictionary column, the day numbers of
+        date_added or the offsets of a string column.
+        """
+        if name not in self._columns:
+            layout = self._layout[name]
+            if layout['type'] == STRING:
+                self._columns[name] = self._array('I', layout['offsets'], self.rows + 1)
+            else:
+                self._columns[name] = self._array(layout['type'], layout['offset'], self.rows)
+        return self._columns[name]
+
+    def string(self, name, idx):
+        offsets = self.column(name)
+        start = self._start + self._layout[name]['data']
+        return str(self._view[start+int(offsets[idx]):start+int(offsets[idx+1])], 'utf-8')
+
+    def url(self, idx):
+        return self.string('url', idx)
+
+    def urls(self, indices):
+        return [self.string('url', idx) for idx in indices]
+
+    def value(self, name, idx):
+        return self.dictionaries[name][self.column(name)[idx]]
+
+    def row(self, idx):
+        """
+        Returns the country code and the row of a CSV list for row idx.
+        """
+        return self.value('country', idx), (
+            self.url(idx), self.value('category_code', idx),
+            self.value('category_description', idx),
+            self.string_date(idx), self.value('source', idx),
+            self.string('notes', idx))
+
+    def string_date(self, idx):
+        day = from_day(int(self.column('date_added')[idx]))
+        if day is None:
+            return self._invalid_dates.get(str(idx), '')
+        return day.isoformat()
+
+    def codes(self, name, values):
+        """
+        Returns the codes of the values of a dictionary column, ignoring
+        the values that are not in it.
+        """
+        codes = self._codes[name]
+        return [codes[value] for value in values if value in codes]
+
+    def select(self, categories=None, countries=None, sources=None,
+               added_after=None, added_before=None):
+        """
+        Returns the indices of the rows matching every filter that is
+        given: categories, countries and sources are collections of
+        values, added_after and added_before are dates or YYYY-MM-DD
+        strings (both excluded), and ValueError is raised if they are not
+        valid dates. Rows without a valid date never match a date filter.
+        """
+        filters = []
+        for name, values in [('category_code', categories),
+                             ('country', countries), ('source', sources)]:
+            if values is not None:
+                filters.append((name, set(self.codes(name, values))))
+        after = to_filter_day(added_after) if added_after is not None else None
+        before = to_filter_day(added_before) if added_before is not None else None
+
+        if self.numpy is not None:
+            np = self.numpy
+            mask = np.ones(self.rows, dtype=bool)
+            for name, codes in filters:
+                mask &= np.isin(self.column(name), list(codes))
+            dates = self.column('date_added')
+            if after is not None:
+                mask &= dates > after
+            if before is not None:
+                mask &= (dates < before) & (dates != MISSING_DATE)
+            return np.flatnonzero(mask)
+
+        indices = range(self.rows)
+        for name, codes in filters:
+            column = self.column(name)
+            indices = [idx for idx in indices if column[idx] in codes]
+        dates = self.column('date_added')
+        if after is not None:
+            indices = [idx for idx in indices if dates[idx] > after]
+        if before is not None:
+            indices = [idx for idx in indices
+                       if dates[idx] < before and dates[idx] != MISSING_DATE]
+        return list(indices)
+
+    def close(self):
+        while self._columns:
+            _, column = self._columns.popitem()
+            if isinstance(column, memoryview):
+                column.release()
+            del column
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
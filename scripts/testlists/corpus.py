@@ -0,0 +1,252 @@
+"""
+Loads the test lists once per process and indexes them, so that the
+maintenance scripts can run several checks without each of them going
+through every CSV file again.
+"""
+import io
+import os
+import csv
+import hashlib
+from collections import OrderedDict
+from glob import glob
+from urllib.parse import urlparse
+
+HEADER = ['url', 'category_code', 'category_description',
+          'date_added', 'source', 'notes']
+
+def get_domain(url):
+    return urlparse(url).netloc.split(':')[0]
+
+def get_country_code(csv_path):
+    return os.path.basename(csv_path)[:-len('.csv')]
+
+def list_paths(lists_path):
+    """
+    Returns the paths of the lists inside of lists_path, skipping the
+    legends.
+    """
+    return [
+        csv_path for csv_path in glob(os.path.join(lists_path, "*.csv"))
+        if not os.path.basename(csv_path).startswith('00-')
+    ]
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as in_file:
+        for chunk in iter(lambda: in_file.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class Corpus(object):
+    """
+    The test lists inside of a directory.
+
+    Lists are parsed the first time they are needed and kept in memory as
+    tuples. The indexes across all the lists are built on first use.
+    Row indexes do not include the header, so row idx is on line idx+2.
+    refresh() forgets the lists that changed on disk since they were read.
+    """
+    def __init__(self, lists_path):
+        self.lists_path = lists_path
+        self.paths = self._list_paths()
+        # The (mtime, size) of every list when it was read
+        self._stats = {}
+        # The SHA-256 of the bytes every list was parsed from
+        self._digests = {}
+        self._headers = {}
+        self._rows = {}
+        self._row_domains = {}
+        self._domains = {}
+        self._url_index = None
+        self._domain_index = None
+        self._category_index = None
+
+    @property
+    def country_codes(self):
+        return list(self.paths.keys())
+
+    def _list_paths(self):
+        return OrderedDict(
+            (get_country_code(csv_path), csv_path)
+            for csv_path in list_paths(self.lists_path)
+        )
+
+    def _stat(self, country_code):
+        try:
+            st = os.stat(self.paths[country_code])
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self, country_code):
+        self._stats[country_code] = self._stat(country_code)
+        # The file is read once so that the digest is the one of the rows
+        # that are returned, even if the file is rewritten meanwhile.
+        with open(self.paths[country_code], 'rb') as in_file:
+            data = in_file.read()
+        self._digests[country_code] = hashlib.sha256(data).hexdigest()
+        reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''),
+                            delimiter=',')
+        self._headers[country_code] = next(reader)
+        for row in reader:
+            yield row
+
+    def _load(self, country_code):
+        self._rows[country_code] = [tuple(row) for row in self._read(country_code)]
+
+    def header(self, country_code):
+        if country_code not in self._headers:
+            self._load(country_code)
+        return self._headers[country_code]
+
+    def digest(self, country_code):
+        """
+        Returns the SHA-256 of the content the list was parsed from.
+        """
+        if country_code not in self._digests:
+            self._load(country_code)
+        return self._digests[country_code]
+
+    def rows(self, country_code):
+        if country_code not in self._rows:
+            self._load(country_code)
+        return self._rows[country_code]
+
+    def entries(self, country_code, table):
+        """
+        Yields the rows of the list as testlists.entry.TestListEntry
+        objects created by table, skipping blank rows. Rows without the
+        expected number of columns are skipped too, and added to
+        table.invalid_rows as (csv_path, line number).
+
+        Unlike rows(), a list that is not loaded yet is read without being
+        kept in memory.
+        """
+        country = table.country_id(country_code)
+        if country_code in self._rows:
+            rows = self._rows[country_code]
+        else:
+            rows = self._read(country_code)
+        for idx, row in enumerate(rows):
+            if not row:
+                continue
+            if len(row) != len(HEADER):
+                table.invalid_rows.append((self.paths[country_code], idx + 2))
+                continue
+            yield table.entry(row, country)
+
+    def row_domains(self, country_code):
+        """
+        Returns the domain of every row of the list. Equal domains are the
+        same string object, so each of them is stored once.
+        """
+        if country_code not in self._row_domains:
+            domains = self._domains
+            row_domains = []
+            for row in self.rows(country_code):
+                domain = get_domain(row[0]) if row else ''
+                row_domains.append(domains.setdefault(domain, domain))
+            self._row_domains[country_code] = row_domains
+        return self._row_domains[country_code]
+
+    def _build_indexes(self):
+        url_index = {}
+        domain_index = {}
+        category_index = {}
+        for country_code in self.paths:
+            row_domains = self.row_domains(country_code)
+            for idx, row in enumerate(self.rows(country_code)):
+                if not row:
+                    continue
+                url = row[0]
+                url_index.setdefault(url, []).append((country_code, idx))
+                domain_index.setdefault(row_domains[idx], set()).add(url)
+                if len(row) > 1:
+                    category_index.setdefault(row[1], set()).add(url)
+        self._url_index = url_index
+        self._domain_index = domain_index
+        self._category_index = category_index
+
+    @property
+    def url_index(self):
+        """
+        Maps every URL to the list of (country_code, row index) where it
+        is found.
+        """
+        if self._url_index is None:
+            self._build_indexes()
+        return self._url_index
+
+    @property
+    def domain_index(self):
+        if self._domain_index is None:
+            self._build_indexes()
+        return self._domain_index
+
+    @property
+    def category_index(self):
+        if self._category_index is None:
+            self._build_indexes()
+        return self._category_index
+
+    def locations(self, url):
+        return self.url_index.get(url, [])
+
+    def urls_for_domain(self, domain):
+        return self.domain_index.get(domain, set())
+
+    def urls_for_category(self, category_code):
+        return self.category_index.get(category_code, set())
+
+    def domains(self):
+        return set(self.domain_index.keys())
+
+    def refresh(self):
+        """
+        Forgets the lists whose file changed since they were read, and
+        everything if lists were added or removed.
+        """
+        paths = self._list_paths()
+        if list(paths.items()) != list(self.paths.items()):
+            self.paths = paths
+            self.invalidate()
+            return
+        for country_code, stat in list(self._stats.items()):
+            if self._stat(country_code) != stat:
+                self.invalidate(country_code)
+
+    def invalidate(self, country_code=None):
+        """
+        Forgets what was loaded for country_code, or for every list, after
+        it has been rewritten on disk.
+        """
+        if country_code is None:
+            self._stats.clear()
+            self._digests.clear()
+            self._headers.clear()
+            self._rows.clear()
+            self._row_domains.clear()
+        else:
+            self._stats.pop(country_code, None)
+            self._digests.pop(country_code, None)
+            self._headers.pop(country_code, None)
+            self._rows.pop(country_code, None)
+            self._row_domains.pop(country_code, None)
+        self._url_index = None
+        self._domain_index = None
+        self._category_index = None
+
+_CORPORA = {}
+
+def load(lists_path):
+    """
+    Returns the Corpus for lists_path, which is only created once per
+    process. The lists that changed on disk since it was last returned
+    are read again.
+    """
+    key = os.path.abspath(lists_path)
+    if key not in _CORPORA:
+        _CORPORA[key] = Corpus(lists_path)
+    else:
+        _CORPORA[key].refresh()
+    return _CORPORA[key]
@@ -0,0 +1,80 @@
+"""
+Compact in-memory representation of the rows of the test lists, for the
+scripts that need to hold many lists at once.
+
+Entries are created by Corpus.entries() and have no per-instance dict.
+Their repeated columns (category code and description, date, source and
+notes) are interned, so each distinct value is stored once, and their
+country is a small integer that an EntryTable maps back to its country
+code.
+"""
+from testlists import corpus
+
+class TestListEntry(object):
+    __slots__ = ('url', 'category_code', 'category_description',
+                 'date_added', 'source', 'notes', 'country')
+
+    def __init__(self, url, category_code, category_description, date_added,
+                 source, notes, country):
+        self.url = url
+        self.category_code = category_code
+        self.category_description = category_description
+        self.date_added = date_added
+        self.source = source
+        self.notes = notes
+        self.country = country
+
+    def row(self):
+        """
+        Returns the entry as a row of a CSV list, in corpus.HEADER order.
+        """
+        return (self.url, self.category_code, self.category_description,
+                self.date_added, self.source, self.notes)
+
+    def __repr__(self):
+        return 'TestListEntry(%r, %r, country=%d)' % (
+            self.url, self.category_code, self.country)
+
+class EntryTable(object):
+    """
+    Interns the strings and numbers the countries of the entries it
+    creates. Entries created by the same table share their strings.
+    """
+    def __init__(self):
+        self._strings = {}
+        self._country_ids = {}
+        self.country_codes = []
+        # (csv_path, line number) of the rows that Corpus.entries() skipped
+        self.invalid_rows = []
+
+    def intern(self, s):
+        return self._strings.setdefault(s, s)
+
+    def country_id(self, country_code):
+        if country_code not in self._country_ids:
+            self._country_ids[country_code] = len(self.country_codes)
+            self.country_codes.append(country_code)
+        return self._country_ids[country_code]
+
+    def country_code(self, entry):
+        return self.country_codes[entry.country]
+
+    def entry(self, row, country):
+        url, category_code, category_description, date_added, source, notes = row
+        intern = self.intern
+        return TestListEntry(url, intern(category_code),
+                             intern(category_description), intern(date_added),
+                             intern(source), intern(notes), country)
+
+def read_entries(lists_path, table=None):
+    """
+    Yields the entries of every list in lists_path, from the shared
+    Corpus. Pass a table to share it with other loads, for example to map
+    the countries back to codes or to see the rows that were skipped.
+    """
+    if table is None:
+        table = EntryTable()
+    lists = corpus.load(lists_path)
+    for country_code in lists.country_codes:
+        for entry in lists.entries(country_code, table):
+            yield entry
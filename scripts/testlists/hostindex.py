@@ -0,0 +1,138 @@
+"""
+Index of the test lists by normalized host, so that finding where a URL
+is already listed does not require going through every list.
+
+Hosts are normalized by lowercasing them and dropping the port, a
+trailing dot and a leading "www.", so lookups do not depend on the
+scheme or on www. Only URLs on the same normalized host match. The add
+command used to match every URL starting with the scheme://host of the
+new one instead, which also matched hosts that merely start with it,
+such as example.community for example.com, and missed the same host
+written with another case or port.
+
+The index is saved next to the lists directory and rebuilt whenever one
+of the lists changed since it was saved.
+"""
+import os
+import json
+from urllib.parse import urlsplit
+
+from testlists import corpus
+
+INDEX_VERSION = 2
+
+def normalize_host(url):
+    """
+    Returns the normalized host of url, which can also be a bare host.
+    """
+    if "://" not in url:
+        url = "http://" + url
+    try:
+        host = urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+    host = host.rstrip(".")
+    if host.startswith("www."):
+        host = host[len("www."):]
+    return host
+
+def normalize_url(url):
+    """
+    Returns url without its scheme, with a normalized host and "/" as the
+    path when it has none, so that the same page always compares equal.
+    """
+    if "://" not in url:
+        url = "http://" + url
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return ""
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+    return normalize_host(url) + target
+
+def index_path(lists_path):
+    return os.path.normpath(lists_path) + ".host-index.json"
+
+def list_stats(lists_path):
+    stats = {}
+    for csv_path in corpus.list_paths(lists_path):
+        st = os.stat(csv_path)
+        stats[corpus.get_country_code(csv_path)] = [st.st_mtime_ns, st.st_size]
+    return stats
+
+class HostIndex(object):
+    def __init__(self, hosts=None, stats=None):
+        # normalized host -> list of [country_code, url, category_code]
+        self.hosts = hosts or {}
+        self.stats = stats or {}
+
+    @classmethod
+    def build(cls, lists_path, lists=None):
+        """
+        Indexes the lists of lists_path. lists is the Corpus to read them
+        from, which must be up to date with the files. By default they are
+        read again from disk, so that the Corpus that corpus.load() shares
+        with the other tools is left alone.
+        """
+        if lists is None:
+            lists = corpus.Corpus(lists_path)
+        index = cls(stats=list_stats(lists_path))
+        for country_code in lists.country_codes:
+            for row in lists.rows(country_code):
+                if row:
+                    index.add(country_code, row[0],
+                              row[1] if len(row) > 1 else None)
+        return index
+
+    def add(self, country_code, url, category_code=None):
+        self.hosts.setdefault(normalize_host(url), []).append(
+            [country_code, url, category_code])
+
+    def entries(self, url):
+        """
+        Returns the [country_code, url, category_code] of every URL listed
+        on the same host as url.
+        """
+        return self.hosts.get(normalize_host(url), [])
+
+    def lookup(self, url):
+        """
+        Returns the URLs listed on the same host as url, grouped by country
+        code.
+        """
+        matches = {}
+        for country_code, target, _ in self.entries(url):
+            matches.setdefault(country_code, []).append(target)
+        return matches
+
+    def save(self, path):
+        with open(path + ".tmp", "w") as out_file:
+            json.dump({"version": INDEX_VERSION, "stats": self.stats,
+                       "hosts": self.hosts}, out_file)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as in_file:
+            data = json.load(in_file)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError("Unsupported host index version")
+        return cls(data["hosts"], data["stats"])
+
+def load(lists_path):
+    """
+    Returns the host index of lists_path, building and saving it again if
+    any list changed since it was saved.
+    """
+    path = index_path(lists_path)
+    try:
+        index = HostIndex.load(path)
+        if index.stats == list_stats(lists_path):
+            return index
+    except (IOError, ValueError, KeyError):
+        pass
+    index = HostIndex.build(lists_path)
+    index.save(path)
+    return index
@@ -0,0 +1,207 @@
+"""
+Checks whether the URLs of the test lists are still served over HTTP(S).
+
+URLs are grouped by host. Each host is checked by a single worker, with
+one keep-alive connection per origin (scheme, host and port), waiting at
+least 1/rate seconds between two requests to the host, while up to
+concurrency hosts are checked at the same time.
+"""
+import ssl
+import time
+import socket
+import http.client
+from urllib.parse import urlsplit, quote
+from concurrent.futures import ThreadPoolExecutor
+
+ALIVE = "alive"
+REDIRECT = "redirect"
+CLIENT_ERROR = "client_error"
+SERVER_ERROR = "server_error"
+TLS_ERROR = "tls_error"
+CONNECTION_ERROR = "connection_error"
+TIMEOUT = "timeout"
+
+USER_AGENT = "test-lists-liveness/1.0"
+
+# Servers that do not implement HEAD usually answer with one of these
+HEAD_NOT_SUPPORTED = set([403, 405, 501])
+
+# At most this much of a GET response body is read, the connection is
+# closed instead of draining bigger bodies.
+MAX_BODY = 64 * 1024
+
+# Characters that are left as they are when percent-encoding the path and
+# query of a URL, including the % of what is already encoded.
+TARGET_SAFE = "/?&=%:@;+,!~*'()"
+
+class ProbeResult(object):
+    def __init__(self, url, status, status_code=None, detail=None, elapsed=None):
+        self.url = url
+        self.status = status
+        self.status_code = status_code
+        self.detail = detail
+        self.elapsed = elapsed
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'status': self.status,
+            'status_code': self.status_code,
+            'detail': self.detail,
+            'elapsed': self.elapsed
+        }
+
+def classify(status_code):
+    if status_code < 300:
+        return ALIVE
+    elif status_code < 400:
+        return REDIRECT
+    elif status_code < 500:
+        return CLIENT_ERROR
+    return SERVER_ERROR
+
+def get_host(url):
+    return urlsplit(url).hostname or ""
+
+def get_origin(url):
+    # Raises ValueError when the port is not a valid one
+    parts = urlsplit(url)
+    default_port = 443 if parts.scheme == "https" else 80
+    return (parts.scheme, parts.hostname or "", parts.port or default_port)
+
+def get_target(url):
+    parts = urlsplit(url)
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+    # http.client only sends ASCII request targets
+    return quote(target, safe=TARGET_SAFE)
+
+class OriginChecker(object):
+    """
+    Checks the URLs of one origin over a single keep-alive connection.
+    """
+    def __init__(self, origin, timeout, ssl_context):
+        self.scheme, self.host, self.port = origin
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.conn = None
+
+    def connect(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port,
+                                               timeout=self.timeout,
+                                               context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port,
+                                          timeout=self.timeout)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def request(self, method, target):
+        reused = self.conn is not None
+        try:
+            return self._request(method, target)
+        except (ConnectionResetError, BrokenPipeError):
+            # Servers close idle keep-alive connections without always
+            # saying so, which is only noticed when reusing them. This
+            # includes http.client.RemoteDisconnected.
+            self.close()
+            if not reused:
+                raise
+            return self._request(method, target)
+
+    def _request(self, method, target):
+        if self.conn is None:
+            self.conn = self.connect()
+        self.conn.request(method, target, headers={
+            "User-Agent": USER_AGENT,
+            "Accept": "*/*"
+        })
+        response = self.conn.getresponse()
+        if method == "GET":
+            response.read(MAX_BODY)
+            if not response.isclosed():
+                # Do not download the rest of a big body just to reuse the
+                # connection
+                self.close()
+        else:
+            response.read()
+        return response
+
+    def check(self, url):
+        start = time.monotonic()
+        target = get_target(url)
+        try:
+            response = self.request("HEAD", target)
+            if response.status in HEAD_NOT_SUPPORTED:
+                response = self.request("GET", target)
+        except (ssl.SSLError, ssl.CertificateError) as exc:
+            self.close()
+            return ProbeResult(url, TLS_ERROR, detail=str(exc),
+                               elapsed=time.monotonic() - start)
+        except socket.timeout as exc:
+            self.close()
+            return ProbeResult(url, TIMEOUT, detail=str(exc),
+                               elapsed=time.monotonic() - start)
+        except (OSError, http.client.HTTPException, ValueError) as exc:
+            # ValueError includes the UnicodeError of hosts that cannot be
+            # encoded and the InvalidURL of targets with control characters
+            self.close()
+            return ProbeResult(url, CONNECTION_ERROR, detail=repr(exc),
+                               elapsed=time.monotonic() - start)
+        status = classify(response.status)
+        detail = response.getheader("Location") if status == REDIRECT else None
+        return ProbeResult(url, status, status_code=response.status,
+                           detail=detail, elapsed=time.monotonic() - start)
+
+def check_host(urls, timeout, rate, ssl_context):
+    checkers = {}
+    interval = 1.0 / rate if rate else 0
+    results = []
+    last = None
+    try:
+        for url in urls:
+            if last is not None and interval:
+                delay = last + interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            last = time.monotonic()
+            try:
+                origin = get_origin(url)
+            except ValueError as exc:
+                results.append(ProbeResult(url, CONNECTION_ERROR,
+                                           detail=repr(exc)))
+                continue
+            if origin not in checkers:
+                checkers[origin] = OriginChecker(origin, timeout, ssl_context)
+            results.append(checkers[origin].check(url))
+    finally:
+        for checker in checkers.values():
+            checker.close()
+    return results
+
+def check_urls(urls, concurrency=32, timeout=10, rate=1, ssl_context=None):
+    """
+    Checks every URL and yields a ProbeResult for each of them, as soon as
+    all the URLs of its host have been checked.
+
+    rate is the maximum number of requests per second sent to one host,
+    whatever the scheme and port.
+    ssl_context defaults to one that verifies certificates.
+    """
+    if ssl_context is None:
+        ssl_context = ssl.create_default_context()
+    hosts = {}
+    for url in urls:
+        hosts.setdefault(get_host(url), []).append(url)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(check_host, host_urls, timeout, rate, ssl_context)
+            for host_urls in hosts.values()
+        ]
+        for future in futures:
+            for result in future.result():
+                yield result
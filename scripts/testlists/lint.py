@@ -0,0 +1,522 @@
+"""
+Checks that the test lists are well formed. This is the library behind
+lint-lists.py: lint() returns the errors instead of printing them.
+"""
+from __future__ import print_function
+
+import os
+import csv
+import json
+import time
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from testlists import corpus
+from testlists.corpus import file_digest
+from testlists.validate import ERR_NOSLASH, validate_url, has_bad_chars
+
+CATEGORY_CODES = {}
+COUNTRY_CODES = {}
+
+NEW_CATEGORY_CODES = "00-LEGEND-new_category_codes.csv"
+LEGACY_CATEGORY_CODES = "00-LEGEND-category_codes.csv"
+COUNTRY_CODES = "00-LEGEND-country_codes.csv"
+
+def is_valid_date(d):
+    try:
+        if datetime.datetime.strptime(d, "%Y-%m-%d").date().isoformat() == d:
+            return True
+    except Exception:
+        pass
+    return False
+
+class TestListError(object):
+    name = 'Test List Error'
+    def __init__(self, csv_path, line_number):
+        self.csv_path = csv_path
+        self.line_number = line_number
+
+    def message(self):
+        return '{} (line {}): {}'.format(
+            self.csv_path, self.line_number, self.name
+        )
+
+    def print(self):
+        print(self.message())
+
+    def to_dict(self):
+        return {
+            'type': type(self).__name__,
+            'csv_path': self.csv_path,
+            'line_number': self.line_number
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        d = dict(d)
+        error_class = ERROR_CLASSES[d.pop('type')]
+        return error_class(**d)
+
+class TestListErrorWithValue(TestListError):
+    def __init__(self, value, csv_path, line_number, details=None):
+        super(TestListErrorWithValue, self).__init__(csv_path, line_number)
+        self.value = value
+        self.details = details
+
+    def message(self):
+        msg = '{} (line {}): {} "{}"'.format(
+            self.csv_path, self.line_number, self.name, self.value
+        )
+        if self.details:
+            msg += ' ({})'.format(self.details)
+        return msg
+
+    def to_dict(self):
+        d = super(TestListErrorWithValue, self).to_dict()
+        d['value'] = self.value
+        d['details'] = self.details
+        return d
+
+class InvalidHeader(TestListError):
+    name = 'Invalid Header'
+
+class InvalidColumnNumber(TestListError):
+    name = 'Invalid Column Number'
+
+class InvalidURL(TestListErrorWithValue):
+    name = 'Invalid URL'
+
+class InvalidNotes(TestListErrorWithValue):
+    name = 'Invalid Notes'
+
+class InvalidSource(TestListErrorWithValue):
+    name = 'Invalid Source'
+
+class DuplicateURL(TestListErrorWithValue):
+    name = 'Duplicate URL'
+
+class InvalidCategoryCode(TestListErrorWithValue):
+    name = 'Invalid Category Code'
+
+class InvalidCategoryDesc(TestListErrorWithValue):
+    name = 'Invalid Category Description'
+
+class InvalidDate(TestListErrorWithValue):
+    name = 'Invalid Date'
+
+class DuplicateURLWithGlobalList(TestListErrorWithValue):
+    name = "Duplicate URL between Local List and Global List"
+
+ERROR_CLASSES = dict(
+    (error_class.__name__, error_class) for error_class in [
+        InvalidHeader, InvalidColumnNumber, InvalidURL, InvalidNotes,
+        InvalidSource, DuplicateURL, InvalidCategoryCode, InvalidCategoryDesc,
+        InvalidDate, DuplicateURLWithGlobalList
+    ]
+)
+
+def get_legacy_description_code(row):
+    return row[1], row[0]
+
+def get_new_description_code(row):
+    return row[0], row[1]
+
+def load_categories(path, get_description_code=get_new_description_code):
+    code_map = {}
+    with open(path, 'r') as in_file:
+        reader = csv.reader(in_file, delimiter=',')
+        next(reader) # skip header
+        for row in reader:
+            desc, code = get_description_code(row)
+            code_map[code] = desc
+    return code_map
+
+def load_global_list(path, lists=None):
+    check_list = set()
+    if lists is None:
+        lists = corpus.Corpus(os.path.dirname(path))
+    for row in lists.rows(corpus.get_country_code(path)):
+        if len(row) == 6:
+            check_list.add(row[0])
+    return check_list
+
+
+def check(url):
+    violations = validate_url(url)
+    if violations:
+        return violations[0]
+
+
+HEADER = corpus.HEADER
+
+class FileReport(object):
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.url_count = 0
+        self.errors = []
+        self.fixes = []
+        self.timings = {}
+        self.cached = False
+        # The SHA-256 of the content that was linted
+        self.sha256 = None
+
+    def print(self):
+        print('* {}'.format(self.csv_path))
+        print('  {} URLs'.format(self.url_count))
+        print('  {} Errors'.format(len(self.errors)))
+        for fix in self.fixes:
+            print(fix)
+
+    def to_dict(self):
+        return {
+            'csv_path': self.csv_path,
+            'url_count': self.url_count,
+            'errors': [e.to_dict() for e in self.errors],
+            'fixes': self.fixes,
+            'timings': self.timings,
+            'cached': self.cached
+        }
+
+PHASES = ['parsing', 'urls', 'categories', 'dedup', 'dates', 'other', 'fixes']
+
+class PhaseTimer(object):
+    """
+    Adds the time elapsed since the previous lap to the given phase.
+    """
+    def __init__(self):
+        self.timings = dict((phase, 0.0) for phase in PHASES)
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.timings[phase] += now - self.last
+        self.last = now
+
+class NullTimer(object):
+    timings = None
+
+    def lap(self, phase):
+        pass
+
+def write_rows(csv_path, rows):
+    with open(csv_path + '.fixed', 'w') as out_file:
+        csv_writer = csv.writer(out_file, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        csv_writer.writerow(HEADER)
+        csv_writer.writerows(rows)
+    os.rename(csv_path + '.fixed', csv_path)
+
+def lint_file(csv_path, category_codes, global_urls_bag,
+              fix_duplicates=False, fix_slash=False, profile=False,
+              lists=None):
+    report = FileReport(csv_path)
+    errors = report.errors
+    timer = PhaseTimer() if profile else NullTimer()
+    if lists is None:
+        lists = corpus.Corpus(os.path.dirname(csv_path))
+    country_code = corpus.get_country_code(csv_path)
+    first_line = lists.header(country_code)
+    file_rows = lists.rows(country_code)
+    report.sha256 = lists.digest(country_code)
+    timer.lap('parsing')
+    if first_line != HEADER:
+        errors.append(
+            InvalidHeader(csv_path, 0)
+        )
+    urls_bag = set()
+    rows = []
+    duplicates = 0
+    without_slash = 0
+    idx = -1
+    for idx, row in enumerate(file_rows):
+        if len(row) != 6:
+            errors.append(
+                InvalidColumnNumber(csv_path, idx+2)
+            )
+            timer.lap('other')
+            continue
+        url, cat_code, cat_desc, date_added, source, notes = row
+        err = check(url)
+        if err:
+            errors.append(
+                InvalidURL(url, csv_path, idx+2, details=err)
+            )
+            if err == ERR_NOSLASH:
+                without_slash += 1
+                row = (row[0] + "/",) + row[1:]
+        timer.lap('urls')
+        if os.path.basename(csv_path) != "global.csv":
+            if url in global_urls_bag:
+                errors.append(
+                    DuplicateURLWithGlobalList(url, csv_path, idx+2)
+                )
+                if fix_duplicates:
+                    duplicates += 1
+                    timer.lap('dedup')
+                    continue
+        timer.lap('dedup')
+
+        try:
+            cat_description = category_codes[cat_code]
+        except KeyError:
+            errors.append(
+                InvalidCategoryCode(cat_code, csv_path, idx+2)
+            )
+        if cat_description != cat_desc:
+            errors.append(
+                InvalidCategoryDesc(cat_desc, csv_path, idx+2)
+            )
+        timer.lap('categories')
+        if url in urls_bag:
+            if not fix_duplicates:
+                errors.append(
+                    DuplicateURL(url, csv_path, idx+2)
+                )
+            duplicates += 1
+            timer.lap('dedup')
+            continue
+        timer.lap('dedup')
+        if not is_valid_date(date_added):
+            errors.append(
+                InvalidDate(date_added, csv_path, idx+2)
+            )
+        timer.lap('dates')
+        if has_bad_chars(notes):
+            errors.append(
+                InvalidNotes(notes, csv_path, idx+2)
+            )
+        if has_bad_chars(source):
+            errors.append(
+                InvalidSource(source, csv_path, idx+2)
+            )
+        urls_bag.add(url)
+        rows.append(row)
+        timer.lap('other')
+    report.url_count = idx+1
+
+    if fix_slash and without_slash > 0:
+        report.fixes.append('Fixing slash in %s' % csv_path)
+        write_rows(csv_path, rows)
+        lists.invalidate(country_code)
+
+    if fix_duplicates and duplicates > 0:
+        rows.sort(key=lambda x: x[0].split('//')[1])
+        write_rows(csv_path, rows)
+        lists.invalidate(country_code)
+        report.fixes.append('Sorting %s - Found %d duplicates' % (csv_path, duplicates))
+
+    timer.lap('fixes')
+    if profile:
+        report.timings = timer.timings
+    return report
+
+# Read-only state shared with the worker processes, populated once per
+# worker by init_worker so that global.csv and the category map are not
+# pickled again for every file.
+_WORKER_STATE = {}
+
+def init_worker(lists_path, category_codes, global_urls_bag, fix_duplicates,
+                fix_slash, profile):
+    _WORKER_STATE.update(
+        category_codes=category_codes,
+        global_urls_bag=global_urls_bag,
+        fix_duplicates=fix_duplicates,
+        fix_slash=fix_slash,
+        profile=profile,
+        lists=corpus.Corpus(lists_path)
+    )
+
+def lint_file_worker(csv_path):
+    return lint_file(csv_path, **_WORKER_STATE)
+
+# Bump this whenever the checks change, so that stale cached results are
+# not replayed.
+CACHE_VERSION = 1
+
+def dependencies_digest(lists_path):
+    # Every file is checked against global.csv and the category legend, so
+    # a change to either of them invalidates all the cached results.
+    return ':'.join([
+        str(CACHE_VERSION),
+        file_digest(os.path.join(lists_path, "global.csv")),
+        file_digest(os.path.join(lists_path, NEW_CATEGORY_CODES))
+    ])
+
+class LintCache(object):
+    """
+    Stores the lint results of every file keyed by the SHA-256 of its
+    content, so that unchanged files are not linted again.
+    """
+    def __init__(self, path, dependencies):
+        self.path = path
+        self.dependencies = dependencies
+        self.entries = {}
+        self.digests = {}
+        try:
+            with open(path, 'r') as in_file:
+                data = json.load(in_file)
+            if data.get('dependencies') == dependencies:
+                self.entries = data['files']
+        except (IOError, ValueError, KeyError):
+            pass
+
+    def get(self, csv_path):
+        digest = file_digest(csv_path)
+        self.digests[csv_path] = digest
+        entry = self.entries.get(csv_path)
+        if entry is None or entry['sha256'] != digest:
+            return None
+        report = FileReport(csv_path)
+        report.cached = True
+        report.sha256 = digest
+        report.url_count = entry['url_count']
+        report.errors = [TestListError.from_dict(e) for e in entry['errors']]
+        return report
+
+    def put(self, report):
+        # The digest of what was linted, not of the file on disk, which may
+        # have changed since get() hashed it.
+        self.entries[report.csv_path] = {
+            'sha256': report.sha256,
+            'url_count': report.url_count,
+            'errors': [e.to_dict() for e in report.errors]
+        }
+
+    def save(self):
+        # Drop the files that were not part of this run
+        files = dict((csv_path, self.entries[csv_path])
+                     for csv_path in self.digests
+                     if csv_path in self.entries)
+        with open(self.path + '.tmp', 'w') as out_file:
+            json.dump({'dependencies': self.dependencies, 'files': files},
+                      out_file)
+        os.rename(self.path + '.tmp', self.path)
+
+def list_csv_paths(lists_path, lists=None):
+    if lists is None:
+        lists = corpus.Corpus(lists_path)
+    return list(lists.paths.values())
+
+class LintResult(object):
+    def __init__(self, reports, timings=None):
+        self.reports = reports
+        self.timings = timings or {}
+
+    @property
+    def errors(self):
+        return [error for report in self.reports for error in report.errors]
+
+    @property
+    def total_urls(self):
+        return sum(report.url_count for report in self.reports)
+
+    @property
+    def total_countries(self):
+        return len(self.reports)
+
+    def to_dict(self):
+        return {
+            'total_urls': self.total_urls,
+            'total_countries': self.total_countries,
+            'error_count': len(self.errors),
+            'files': [report.to_dict() for report in self.reports],
+            'timings': self.timings
+        }
+
+    def to_sarif(self):
+        """
+        Returns the errors as a SARIF 2.1.0 log.
+        """
+        rules = [
+            {
+                'id': error_class.__name__,
+                'shortDescription': {'text': error_class.name}
+            }
+            for error_class in ERROR_CLASSES.values()
+        ]
+        results = [
+            {
+                'ruleId': type(error).__name__,
+                'level': 'error',
+                'message': {'text': error.message()},
+                'locations': [{
+                    'physicalLocation': {
+                        'artifactLocation': {'uri': error.csv_path},
+                        # The header is reported as line 0
+                        'region': {'startLine': max(error.line_number, 1)}
+                    }
+                }]
+            }
+            for error in self.errors
+        ]
+        return {
+            'version': '2.1.0',
+            '$schema': 'https://json.schemastore.org/sarif-2.1.0.json',
+            'runs': [{
+                'tool': {'driver': {'name': 'lint-lists', 'rules': rules}},
+                'results': results
+            }]
+        }
+
+def lint(lists_path, fix_duplicates=False, fix_slash=False, jobs=1,
+         cache_path=None, profile=False):
+    """
+    Lints every list in lists_path and returns a LintResult. See lint-lists.py
+    for the meaning of the options.
+    """
+    timings = {}
+    start = time.perf_counter()
+    # Every run reads the lists again, as they may have been edited since
+    # the last one in the same process.
+    lists = corpus.Corpus(lists_path)
+    category_codes = load_categories(
+        os.path.join(lists_path, NEW_CATEGORY_CODES),
+        get_new_description_code
+    )
+    # preload the global list to check against looking for dupes
+    global_urls_bag = load_global_list(os.path.join(lists_path, "global.csv"),
+                                       lists)
+    csv_paths = list_csv_paths(lists_path, lists)
+    timings['setup'] = time.perf_counter() - start
+
+    # The fixers need to go through every row, so they bypass the cache
+    cache = None
+    if cache_path and not (fix_duplicates or fix_slash):
+        cache = LintCache(cache_path, dependencies_digest(lists_path))
+
+    reports = {}
+    to_lint = []
+    for csv_path in csv_paths:
+        report = cache.get(csv_path) if cache else None
+        if report is None:
+            to_lint.append(csv_path)
+        else:
+            reports[csv_path] = report
+
+    if jobs > 1:
+        with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=init_worker,
+                initargs=(lists_path, category_codes, global_urls_bag,
+                          fix_duplicates, fix_slash, profile)) as executor:
+            linted = list(executor.map(lint_file_worker, to_lint,
+                                       chunksize=4))
+    else:
+        linted = [
+            lint_file(csv_path, category_codes, global_urls_bag,
+                      fix_duplicates=fix_duplicates, fix_slash=fix_slash,
+                      profile=profile, lists=lists)
+            for csv_path in to_lint
+        ]
+    for report in linted:
+        reports[report.csv_path] = report
+        if cache:
+            cache.put(report)
+    if cache:
+        cache.save()
+
+    timings['total'] = time.perf_counter() - start
+
+    # Reports are always in glob order, so the output does not depend on
+    # the number of jobs or on what was cached.
+    return LintResult([reports[csv_path] for csv_path in csv_paths],
+                      timings if profile else {})
@@ -0,0 +1,152 @@
+"""
+Answers whether a URL or a host is in any test list, in which countries
+and under which category, from the host index of testlists.hostindex.
+
+The index is reloaded in the background when a list changes. Queries
+never wait for a reload: the new index is built on the side and then
+replaces the reference to the old one, which the queries already running
+keep using until they return.
+"""
+import sys
+import time
+import threading
+import itertools
+from collections import deque
+
+from testlists import hostindex
+from testlists.hostindex import normalize_host, normalize_url
+
+class LookupIndex(object):
+    """
+    A host index with its entries also grouped by normalized URL. It is
+    never modified once built.
+    """
+    def __init__(self, host_index):
+        self.stats = host_index.stats
+        self.hosts = host_index.hosts
+        self.urls = {}
+        for entries in self.hosts.values():
+            for entry in entries:
+                self.urls.setdefault(normalize_url(entry[1]), []).append(entry)
+
+def _matches(entries):
+    return [
+        {'country': country_code, 'url': url, 'category_code': category_code}
+        for country_code, url, category_code in entries
+    ]
+
+class Metrics(object):
+    """
+    Latency and rate of the queries. Only the last max_samples durations
+    are kept to compute the percentiles.
+    """
+    def __init__(self, window=60.0, max_samples=100000):
+        self.window = window
+        self.started = time.monotonic()
+        self.total = 0
+        self._counter = itertools.count(1)
+        # deque.append() and deque.copy() are atomic, so recording does
+        # not need a lock
+        self._samples = deque(maxlen=max_samples)
+
+    def record(self, start, duration):
+        self.total = next(self._counter)
+        self._samples.append((start, duration))
+
+    def summary(self):
+        now = time.monotonic()
+        samples = self._samples.copy()
+        durations = sorted(duration for _, duration in samples)
+
+        def percentile(q):
+            if not durations:
+                return None
+            return durations[min(len(durations) - 1, int(q * len(durations)))] * 1000
+
+        since = max(now - self.window, self.started)
+        if samples and len(samples) == samples.maxlen:
+            # Older queries of the window were dropped from the samples
+            since = max(since, samples[0][0])
+        recent = sum(1 for start, _ in samples if start >= since)
+        elapsed = (now - since) or 1
+        return {
+            'queries': self.total,
+            'qps': recent / elapsed,
+            'p50_ms': percentile(0.50),
+            'p99_ms': percentile(0.99),
+            'samples': len(durations)
+        }
+
+class Lookup(object):
+    def __init__(self, lists_path, reload_interval=2.0):
+        self.lists_path = lists_path
+        self.reload_interval = reload_interval
+        self.index = LookupIndex(hostindex.load(lists_path))
+        self.metrics = Metrics()
+        self.generation = 1
+        self.loaded_at = time.time()
+        self._stop = threading.Event()
+        self._watcher = None
+        if reload_interval:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def reload(self, force=False):
+        """
+        Loads the index again if a list changed since it was loaded.
+        Returns True if it was replaced.
+        """
+        if not force and hostindex.list_stats(self.lists_path) == self.index.stats:
+            return False
+        index = LookupIndex(hostindex.load(self.lists_path))
+        self.index = index
+        self.generation += 1
+        self.loaded_at = time.time()
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as exc:
+                # Keep serving the index that was loaded last
+                print('Failed to reload {}: {!r}'.format(self.lists_path, exc),
+                      file=sys.stderr)
+
+    def lookup(self, url):
+        """
+        Returns the entries listing exactly url, regardless of its scheme
+        and of a leading www., and every entry on the same host. url can
+        also be a bare host.
+        """
+        start = time.monotonic()
+        index = self.index
+        host = normalize_host(url)
+        host_entries = index.hosts.get(host, [])
+        url_entries = index.urls.get(normalize_url(url), [])
+        result = {
+            'query': url,
+            'host': host,
+            'listed': bool(host_entries),
+            'countries': sorted(set(entry[0] for entry in host_entries)),
+            'categories': sorted(set(entry[2] for entry in host_entries
+                                     if entry[2] is not None)),
+            'url_matches': _matches(url_entries),
+            'host_matches': _matches(host_entries)
+        }
+        self.metrics.record(start, time.monotonic() - start)
+        return result
+
+    def status(self):
+        status = self.metrics.summary()
+        status.update({
+            'generation': self.generation,
+            'loaded_at': self.loaded_at,
+            'hosts': len(self.index.hosts)
+        })
+        return status
+
+    def close(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
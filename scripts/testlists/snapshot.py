@@ -0,0 +1,201 @@
+"""
+Compact binary snapshot of the test lists.
+
+Every string is stored once in a string table and referred to by its
+index. Categories and countries are small integer IDs. All the sections
+are arrays of little-endian uint32, so a snapshot can be memory-mapped
+and queried without parsing it.
+
+Layout:
+
+    header      MAGIC, VERSION, string_count, category_count,
+                country_count, entry_count, string_bytes
+    offsets     string_count+1 x uint32, string i is blob[off[i]:off[i+1]]
+    blob        string_bytes of UTF-8, padded to 4 bytes
+    categories  category_count x uint32 (string ID of the category code)
+    countries   country_count x (code string ID, first entry, entry count)
+    entries     entry_count x (url, category ID, category description,
+                date_added, source, notes), grouped by country
+"""
+import os
+import sys
+import mmap
+import struct
+from array import array
+
+MAGIC = b'TLSNAP\0\0'
+VERSION = 1
+
+HEADER = struct.Struct('<8s6I')
+COUNTRY_FIELDS = 3
+ENTRY_FIELDS = 6
+
+class InvalidSnapshot(Exception):
+    pass
+
+def _uint32_array(values):
+    a = array('I', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tobytes()
+
+def _pad(data):
+    return data + b'\0' * (-len(data) % 4)
+
+class SnapshotWriter(object):
+    def __init__(self):
+        self.strings = {}
+        self.categories = {}
+        self.countries = []
+        self.entries = []
+
+    def intern(self, s):
+        if s not in self.strings:
+            self.strings[s] = len(self.strings)
+        return self.strings[s]
+
+    def category_id(self, code):
+        if code not in self.categories:
+            self.intern(code)
+            self.categories[code] = len(self.categories)
+        return self.categories[code]
+
+    def add_country(self, country_code, rows):
+        first = len(self.entries) // ENTRY_FIELDS
+        count = 0
+        for row in rows:
+            if len(row) != 6:
+                continue
+            url, category_code, category_description, date_added, source, notes = row
+            self.entries.extend([
+                self.intern(url),
+                self.category_id(category_code),
+                self.intern(category_description),
+                self.intern(date_added),
+                self.intern(source),
+                self.intern(notes)
+            ])
+            count += 1
+        self.countries.extend([self.intern(country_code), first, count])
+
+    def write(self, path):
+        offsets = [0]
+        blob = []
+        for s in self.strings:
+            encoded = s.encode('utf-8')
+            blob.append(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+        blob = b''.join(blob)
+        categories = [self.strings[code] for code in self.categories]
+
+        with open(path + '.tmp', 'wb') as out_file:
+            out_file.write(HEADER.pack(
+                MAGIC, VERSION, len(self.strings), len(categories),
+                len(self.countries) // COUNTRY_FIELDS,
+                len(self.entries) // ENTRY_FIELDS, len(blob)
+            ))
+            out_file.write(_uint32_array(offsets))
+            out_file.write(_pad(blob))
+            out_file.write(_uint32_array(categories))
+            out_file.write(_uint32_array(self.countries))
+            out_file.write(_uint32_array(self.entries))
+        os.replace(path + '.tmp', path)
+
+def write_snapshot(lists, path, country_codes=None):
+    """
+    Writes the lists of a corpus.Corpus to a snapshot in path.
+    """
+    writer = SnapshotWriter()
+    for country_code in country_codes or lists.country_codes:
+        writer.add_country(country_code, lists.rows(country_code))
+    writer.write(path)
+
+class Snapshot(object):
+    """
+    A memory-mapped snapshot. Only the strings that are looked up are
+    decoded.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as in_file:
+            # mmap refuses to map an empty file
+            if os.fstat(in_file.fileno()).st_size < HEADER.size:
+                raise InvalidSnapshot(path)
+            self._mmap = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        (magic, version, string_count, category_count, country_count,
+         entry_count, string_bytes) = HEADER.unpack_from(self._mmap, 0)
+        size = (HEADER.size + (string_count + 1) * 4 + string_bytes +
+                (-string_bytes % 4) + category_count * 4 +
+                country_count * COUNTRY_FIELDS * 4 +
+                entry_count * ENTRY_FIELDS * 4)
+        if magic != MAGIC or version != VERSION or len(self._mmap) < size:
+            self._view.release()
+            self._mmap.close()
+            raise InvalidSnapshot(path)
+
+        pos = HEADER.size
+        self._offsets, pos = self._section(pos, string_count + 1)
+        self._blob = self._view[pos:pos+string_bytes]
+        pos += string_bytes + (-string_bytes % 4)
+        self._categories, pos = self._section(pos, category_count)
+        self._countries, pos = self._section(pos, country_count * COUNTRY_FIELDS)
+        self._entries, pos = self._section(pos, entry_count * ENTRY_FIELDS)
+
+        self._country_index = {}
+        for idx in range(country_count):
+            code, first, count = self._countries[idx*COUNTRY_FIELDS:(idx+1)*COUNTRY_FIELDS]
+            self._country_index[self.string(code)] = (first, count)
+
+    def _section(self, pos, count):
+        end = pos + count * 4
+        if sys.byteorder == 'little':
+            section = self._view[pos:end].cast('I')
+        else:
+            section = array('I', self._view[pos:end].tobytes())
+            section.byteswap()
+        return section, end
+
+    def string(self, sid):
+        return str(self._blob[self._offsets[sid]:self._offsets[sid+1]], 'utf-8')
+
+    @property
+    def country_codes(self):
+        return list(self._country_index.keys())
+
+    def category_code(self, category_id):
+        return self.string(self._categories[category_id])
+
+    def _entry_range(self, country_code):
+        first, count = self._country_index[country_code]
+        return range(first * ENTRY_FIELDS, (first + count) * ENTRY_FIELDS,
+                     ENTRY_FIELDS)
+
+    def urls(self, country_code):
+        entries = self._entries
+        return [self.string(entries[pos]) for pos in self._entry_range(country_code)]
+
+    def rows(self, country_code):
+        """
+        Yields the rows of a country in the same form as they are in the
+        CSV lists.
+        """
+        entries = self._entries
+        for pos in self._entry_range(country_code):
+            url, category_id, description, date_added, source, notes = entries[pos:pos+ENTRY_FIELDS]
+            yield (self.string(url), self.category_code(category_id),
+                   self.string(description), self.string(date_added),
+                   self.string(source), self.string(notes))
+
+    def close(self):
+        for section in [self._offsets, self._blob, self._categories,
+                        self._countries, self._entries]:
+            if isinstance(section, memoryview):
+                section.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
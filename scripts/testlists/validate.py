@@ -0,0 +1,58 @@
+"""
+Validation of the URLs in the test lists.
+"""
+import re
+
+from urllib.parse import urlparse
+
+VALID_URL = re.compile(
+        r'^(?:http)s?://' # http:// or https://
+        r'(?P<authority>'
+        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|' #domain...
+        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})' # ...or ip
+        r'(?::\d+)?)' # optional port
+        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+BAD_CHARS = ["\r", "\n", "\t", "\\"]
+BAD_CHARS_RE = re.compile('[' + re.escape(''.join(BAD_CHARS)) + ']')
+
+ERR_NOMATCH = "No match"
+ERR_BADCHARS = "Bad chars"
+ERR_SPACES = "Extra spaces at ends"
+ERR_NOSLASH = "No trailing slash"
+
+NO_VIOLATIONS = ()
+
+def has_bad_chars(value):
+    return BAD_CHARS_RE.search(value) is not None
+
+def _has_empty_path(url, m):
+    if m is None:
+        # Only for the URLs that are already invalid
+        return urlparse(url).path == ""
+    # The authority can only be followed by "/", "?" or the end of the URL
+    end = m.end('authority')
+    return end == len(url) or url[end] != '/'
+
+def validate_url(url):
+    """
+    Returns a tuple of every violation found in url, in the order in which
+    they are reported, or an empty tuple when url is valid.
+    """
+    m = VALID_URL.match(url)
+    bad_chars = BAD_CHARS_RE.search(url) is not None
+    spaces = url[:1].isspace() or url[-1:].isspace()
+    empty_path = _has_empty_path(url, m)
+    if m is not None and not (bad_chars or spaces or empty_path):
+        return NO_VIOLATIONS
+
+    violations = []
+    if m is None:
+        violations.append(ERR_NOMATCH)
+    if bad_chars:
+        violations.append(ERR_BADCHARS)
+    if spaces:
+        violations.append(ERR_SPACES)
+    if empty_path:
+        violations.append(ERR_NOSLASH)
+    return tuple(violations)
@@ -0,0 +1,49 @@
+# Checks the columnar export of testlists.columnar, with and without numpy.
+#
+# $ python -m pytest scripts/tests/
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# XXX perhaps make this better
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from testlists import columnar
+
+LIST = """url,category_code,category_description,date_added,source,notes
+https://example.com/,NEWS,News Media,2020-01-02,,
+https://example.org/,NEWS,News Media,2020-13-45,,
+https://example.net/,NEWS,News Media,,,
+"""
+
+class ColumnarTest(unittest.TestCase):
+    def setUp(self):
+        self.work_path = tempfile.mkdtemp(prefix="testlists-columnar-")
+        with open(os.path.join(self.work_path, "it.csv"), "w") as out_file:
+            out_file.write(LIST)
+        self.path = os.path.join(self.work_path, "lists.columns")
+        columnar.write_columns(self.work_path, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_path)
+
+    def test_invalid_dates_kept(self):
+        for use_numpy in (True, False):
+            with columnar.Columns(self.path, use_numpy=use_numpy) as columns:
+                self.assertEqual([columns.row(idx)[1][3] for idx in range(3)],
+                                 ["2020-01-02", "2020-13-45", ""])
+                self.assertEqual(list(columns.select(added_after="2020-01-01")),
+                                 [0])
+
+    def test_invalid_date_filter(self):
+        for use_numpy in (True, False):
+            with columnar.Columns(self.path, use_numpy=use_numpy) as columns:
+                self.assertRaises(ValueError, columns.select,
+                                  added_after="2020-13-45")
+                self.assertRaises(ValueError, columns.select,
+                                  added_before="yesterday")
+
+if __name__ == "__main__":
+    unittest.main()
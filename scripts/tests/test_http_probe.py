@@ -0,0 +1,152 @@
+# Checks testlists.http_probe against a local HTTP server.
+#
+# $ python -m pytest scripts/tests/
+
+import os
+import sys
+import time
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# XXX perhaps make this better
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from testlists import http_probe
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # path: (status of HEAD, status of GET, extra headers)
+    ROUTES = {
+        '/alive': (200, 200, {}),
+        '/redirect': (301, 301, {'Location': '/alive'}),
+        '/missing': (404, 404, {}),
+        '/broken': (500, 500, {}),
+        '/no-head': (405, 200, {})
+    }
+
+    def respond(self, method):
+        # Recorded before responding, so that the client cannot be done
+        # before the request is
+        self.server.requests.append((method, self.path))
+        path = self.path.split('?')[0]
+        if path.startswith('/%D0%B1'):
+            # The percent-encoded UTF-8 of a path starting with б
+            path = '/alive'
+        if path.startswith('/idle-close/'):
+            # Closes the connection after every response without sending
+            # Connection: close, as servers closing idle connections do
+            path = '/alive'
+            self.close_connection = True
+        head_status, get_status, headers = self.ROUTES.get(path, (404, 404, {}))
+        body = b'ok\n' if method == 'GET' else b''
+        self.send_response(head_status if method == 'HEAD' else get_status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.respond('HEAD')
+
+    def do_GET(self):
+        self.respond('GET')
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class HTTPProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = start_server()
+        self.base = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def check(self, paths, **kwargs):
+        kwargs.setdefault('rate', 0)
+        kwargs.setdefault('timeout', 5)
+        urls = [self.base + path for path in paths]
+        return dict((r.url[len(self.base):], r)
+                    for r in http_probe.check_urls(urls, **kwargs))
+
+    def test_statuses(self):
+        results = self.check(['/alive', '/redirect', '/missing', '/broken'])
+        self.assertEqual(results['/alive'].status, http_probe.ALIVE)
+        self.assertEqual(results['/redirect'].status, http_probe.REDIRECT)
+        self.assertEqual(results['/redirect'].detail, '/alive')
+        self.assertEqual(results['/missing'].status, http_probe.CLIENT_ERROR)
+        self.assertEqual(results['/missing'].status_code, 404)
+        self.assertEqual(results['/broken'].status, http_probe.SERVER_ERROR)
+
+    def test_head_fallback(self):
+        results = self.check(['/no-head'])
+        self.assertEqual(results['/no-head'].status, http_probe.ALIVE)
+        self.assertEqual(self.server.requests,
+                         [('HEAD', '/no-head'), ('GET', '/no-head')])
+
+    def test_tls_error(self):
+        # The server only speaks plain HTTP
+        url = 'https://127.0.0.1:{}/alive'.format(self.server.server_address[1])
+        results = list(http_probe.check_urls([url], timeout=5))
+        self.assertEqual(results[0].status, http_probe.TLS_ERROR)
+
+    def test_connection_error(self):
+        port = self.server.server_address[1]
+        self.tearDown()
+        results = list(http_probe.check_urls(
+            ['http://127.0.0.1:{}/alive'.format(port)], timeout=5))
+        self.assertEqual(results[0].status, http_probe.CONNECTION_ERROR)
+        self.setUp()
+
+    def test_non_ascii_path(self):
+        results = self.check(['/беларусь/s-9500?q=б'])
+        self.assertEqual(results['/беларусь/s-9500?q=б'].status,
+                         http_probe.ALIVE)
+        self.assertEqual(self.server.requests[0],
+                         ('HEAD', '/%D0%B1%D0%B5%D0%BB%D0%B0%D1%80%D1%83%D1%81'
+                                  '%D1%8C/s-9500?q=%D0%B1'))
+
+    def test_bad_port(self):
+        url = 'http://127.0.0.1:99999/alive'
+        results = list(http_probe.check_urls([url, self.base + '/alive'],
+                                             rate=0, timeout=5))
+        self.assertEqual([(r.url, r.status) for r in results],
+                         [(url, http_probe.CONNECTION_ERROR),
+                          (self.base + '/alive', http_probe.ALIVE)])
+        self.assertIn('Port', results[0].detail)
+
+    def test_idle_connection_closed(self):
+        paths = ['/idle-close/{}'.format(idx) for idx in range(6)]
+        results = self.check(paths)
+        self.assertEqual([results[path].status for path in paths],
+                         [http_probe.ALIVE] * len(paths))
+
+    def test_rate_per_host(self):
+        other = start_server()
+        try:
+            urls = [
+                'http://127.0.0.1:{}/alive'.format(server.server_address[1])
+                for server in (self.server, other, self.server, other)
+            ]
+            start = time.monotonic()
+            results = list(http_probe.check_urls(urls, rate=10, timeout=5))
+            elapsed = time.monotonic() - start
+        finally:
+            other.shutdown()
+            other.server_close()
+        self.assertEqual([r.status for r in results], [http_probe.ALIVE] * 4)
+        # Both ports are on the same host, so they share its rate
+        self.assertGreaterEqual(elapsed, 0.3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,273 @@
+# Checks the legacy updaters of scripts/legacy against a local HTTP
+# server.
+#
+# $ python -m pytest scripts/tests/
+
+import os
+import csv
+import sys
+import glob
+import json
+import shutil
+import time
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# XXX perhaps make this better
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "legacy", "lib"))
+from lists import stream
+from lists.resource import Resource
+from lists.sources import update_all
+from lists.official.it.bofh import BOFHBlockList
+
+LISTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "..", "..", "lists")
+
+BOFH_PAGE = """<html><body><table><tbody>
+<tr><td>2013-01-02</td><td><a href="#">example.com</a></td><td>Farmaci</td><td>AGCOM</td><td>Note</td></tr>
+<tr><td>2014-03-04</td><td><a href="#">example.org</a></td><td>Discussioni sull'età del consenso</td><td>GdF</td></tr>
+<tr><td>header row without a link</td></tr>
+</tbody></table></body></html>
+""".encode("utf-8")
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path == "/trickle":
+            self.trickle()
+            return
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = self.server.etags.get(self.path)
+        last_modified = self.server.last_modified.get(self.path)
+        if (etag is not None and self.headers.get("If-None-Match") == etag) or \
+                (last_modified is not None and
+                 self.headers.get("If-Modified-Since") == last_modified):
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        if last_modified is not None:
+            self.send_header("Last-Modified", last_modified)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def trickle(self):
+        # Sends a byte every 0.1 seconds, so that the socket never times out
+        self.send_response(200)
+        self.send_header("Content-Length", "1000")
+        self.end_headers()
+        try:
+            for _ in range(1000):
+                self.wfile.write(b"x")
+                self.wfile.flush()
+                time.sleep(0.1)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+class LineList(Resource):
+    name = "test/lines"
+    key = "notes"
+
+# The update_all() tests set their download_url and destination
+
+class SlowList(LineList):
+    name = "test/slow"
+
+class QueuedList(LineList):
+    name = "test/queued"
+
+class FastList(LineList):
+    name = "test/fast"
+
+class LegacyUpdaterTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.work_path = tempfile.mkdtemp(prefix="testlists-legacy-")
+        # Downloads are saved relative to the working directory
+        os.chdir(self.work_path)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+        self.server.daemon_threads = True
+        self.server.files = {}
+        self.server.etags = {}
+        self.server.last_modified = {}
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_path)
+
+    def url(self, path):
+        return "http://127.0.0.1:%d%s" % (self.server.server_address[1], path)
+
+    def make_source(self, cls, path, dst_file_name):
+        source = cls(dst_file_name)
+        source.download_url = self.url(path)
+        return source
+
+    def read_rows(self, dst_file_name):
+        with open(dst_file_name, newline="") as f:
+            return list(csv.reader(f))
+
+    def test_download_and_parse(self):
+        self.server.files["/lines.txt"] = b"one\ntwo\nthree"
+        source = self.make_source(LineList, "/lines.txt", "lines.csv")
+        source.update()
+        rows = self.read_rows("lines.csv")
+        self.assertEqual([row[-1] for row in rows[1:]], ["one", "two", "three"])
+        with open(source.latest_download(), "rb") as f:
+            self.assertEqual(f.read(), b"one\ntwo\nthree")
+        # The partial download was renamed once complete
+        self.assertEqual([name for name in os.listdir(source.dst_directory)
+                          if name.endswith(".part")], [])
+
+    def test_skip_download(self):
+        self.server.files["/lines.txt"] = b"one\ntwo\n"
+        self.make_source(LineList, "/lines.txt", "lines.csv").update()
+        del self.server.files["/lines.txt"]
+        # Parses the last download again without the server
+        LineList("again.csv").update(skip_download=True)
+        self.assertEqual(self.read_rows("again.csv"), self.read_rows("lines.csv"))
+
+    def test_skip_download_without_download(self):
+        self.assertRaises(IOError, LineList("lines.csv").update, True)
+
+    def downloads(self, source):
+        return glob.glob(os.path.join(source.dst_directory, "*.dat"))
+
+    def test_not_modified_etag(self):
+        self.server.files["/lines.txt"] = b"one\ntwo\n"
+        self.server.etags["/lines.txt"] = '"v1"'
+        source = self.make_source(LineList, "/lines.txt", "lines.csv")
+        self.assertEqual(source.update()["added"], ["one", "two"])
+        self.assertEqual(source.update(), None)
+        self.assertEqual(self.server.requests[-1][1].get("If-None-Match"), '"v1"')
+        self.assertEqual(len(self.downloads(source)), 1)
+
+    def test_not_modified_since(self):
+        self.server.files["/lines.txt"] = b"one\ntwo\n"
+        self.server.last_modified["/lines.txt"] = "Tue, 01 Jan 2019 00:00:00 GMT"
+        source = self.make_source(LineList, "/lines.txt", "lines.csv")
+        source.update()
+        self.assertEqual(source.update(), None)
+        self.assertEqual(self.server.requests[-1][1].get("If-Modified-Since"),
+                         "Tue, 01 Jan 2019 00:00:00 GMT")
+        self.assertEqual(len(self.downloads(source)), 1)
+
+    def test_unchanged_without_validators(self):
+        self.server.files["/lines.txt"] = b"one\ntwo\n"
+        source = self.make_source(LineList, "/lines.txt", "lines.csv")
+        source.update()
+        # The server sends the same data again, which is hashed and dropped
+        self.assertEqual(source.update(), None)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(len(self.downloads(source)), 1)
+
+    def test_diff(self):
+        self.server.files["/lines.txt"] = b"one\ntwo\n"
+        self.server.etags["/lines.txt"] = '"v1"'
+        source = self.make_source(LineList, "/lines.txt", "lines.csv")
+        source.update()
+        self.server.files["/lines.txt"] = b"two\nthree\n"
+        self.server.etags["/lines.txt"] = '"v2"'
+        diff = source.update()
+        self.assertEqual((diff["added"], diff["removed"]), (["three"], ["one"]))
+        # Entries removed from the source stay in the destination file
+        self.assertEqual([row[-1] for row in self.read_rows("lines.csv")[1:]],
+                         ["one", "two", "three"])
+        diff_files = glob.glob(os.path.join(source.dst_directory, "*.diff.json"))
+        self.assertEqual(len(diff_files), 2)
+        with open(sorted(diff_files)[-1]) as f:
+            self.assertEqual(json.load(f), diff)
+        with open(source.state_filename) as f:
+            self.assertEqual(json.load(f)["keys"], ["three", "two"])
+
+    def test_update_all_deadline(self):
+        self.server.files["/lines.txt"] = b"one\ntwo\n"
+        SlowList.download_url = self.url("/trickle")
+        QueuedList.download_url = FastList.download_url = self.url("/lines.txt")
+        SlowList.destination = QueuedList.destination = "shared.csv"
+        FastList.destination = "fast.csv"
+        start = time.monotonic()
+        results = dict(
+            (name, (result, error)) for name, result, error, _ in
+            update_all([SlowList, QueuedList, FastList], timeout=5, deadline=1)
+        )
+        self.assertLess(time.monotonic() - start, 4)
+        self.assertEqual(results["test/slow"], (None, "timed out after 1s"))
+        # The next source of the same destination still runs
+        self.assertEqual(results["test/queued"][1], None)
+        self.assertEqual(results["test/fast"][0]["added"], ["one", "two"])
+        self.assertEqual([row[-1] for row in self.read_rows("shared.csv")[1:]],
+                         ["one", "two"])
+
+    def test_bofh_chunks(self):
+        # Rows and characters split over several chunks are put back
+        # together
+        whole = list(BOFHBlockList().parse_chunks([BOFH_PAGE]))
+        for size in (1, 2, 7):
+            chunks = [BOFH_PAGE[idx:idx + size]
+                      for idx in range(0, len(BOFH_PAGE), size)]
+            self.assertEqual(list(BOFHBlockList().parse_chunks(chunks)), whole)
+        self.assertEqual([item["url"] for item in whole],
+                         ["example.com", "example.org"])
+        self.assertEqual(whole[1]["category_code"], "HATE")
+        self.assertEqual(whole[1]["notes"], None)
+
+    def test_bofh_update(self):
+        self.server.files["/elenchi.html"] = BOFH_PAGE
+        self.make_source(BOFHBlockList, "/elenchi.html", "bofh.csv").update()
+        rows = self.read_rows("bofh.csv")
+        self.assertEqual([row[0] for row in rows[1:]],
+                         ["example.com", "example.org"])
+
+    def test_bofh_existing_list(self):
+        # Updates a copy of the shipped list, whose rows start with the URL
+        shutil.copyfile(os.path.join(LISTS_PATH, "official", "it", "bofh.csv"),
+                        "bofh.csv")
+        before = self.read_rows("bofh.csv")
+        self.server.files["/elenchi.html"] = BOFH_PAGE.replace(
+            b"example.com", before[1][0].encode("utf-8"))
+        source = self.make_source(BOFHBlockList, "/elenchi.html", "bofh.csv")
+        self.assertIn(before[1][0], source.load_keys())
+        source.update()
+        after = self.read_rows("bofh.csv")
+        self.assertEqual(after[0], before[0])
+        self.assertEqual(after[:len(before)], before)
+        self.assertEqual(after[len(before):][0][:2], ["example.org", "official/it/bofh"])
+        self.assertEqual(len(after), len(before) + 1)
+        self.assertEqual(set(len(row) for row in after), set([len(before[0])]))
+        urls = [row[0] for row in after[1:]]
+        self.assertEqual(len(urls), len(set(urls)))
+
+    def test_iter_lines(self):
+        data = "a\nbé\r\n\nlast".encode("utf-8")
+        chunks = [data[idx:idx + 1] for idx in range(len(data))]
+        self.assertEqual(list(stream.iter_lines(chunks)),
+                         ["a\n", "bé\r\n", "\n", "last"])
+
+    def test_prefetch(self):
+        chunks = [b"%d" % idx for idx in range(100)]
+        self.assertEqual(list(stream.prefetch(iter(chunks), depth=2)), chunks)
+
+        def failing():
+            yield b"ok"
+            raise IOError("connection lost")
+        self.assertRaises(IOError, list, stream.prefetch(failing()))
+
+if __name__ == "__main__":
+    unittest.main()
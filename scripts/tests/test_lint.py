@@ -0,0 +1,54 @@
+# Checks that testlists.lint.lint() sees the edits made to the lists
+# between two runs in the same process.
+#
+# $ python -m pytest scripts/tests/
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# XXX perhaps make this better
+SCRIPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(SCRIPTS_PATH)
+from testlists.lint import lint, InvalidURL, NEW_CATEGORY_CODES
+
+LISTS_PATH = os.path.join(SCRIPTS_PATH, "..", "lists")
+
+HEADER = "url,category_code,category_description,date_added,source,notes\n"
+ROW = "https://example.com/,NEWS,News Media,2020-01-02,,\n"
+BAD_ROW = "https://example.org,NEWS,News Media,2020-01-02,,\n"
+
+@unittest.skipUnless(os.path.isdir(LISTS_PATH), "no test lists")
+class LintTest(unittest.TestCase):
+    def setUp(self):
+        self.lists_path = tempfile.mkdtemp(prefix="testlists-lint-")
+        shutil.copy(os.path.join(LISTS_PATH, NEW_CATEGORY_CODES),
+                    self.lists_path)
+        self.write_list("global.csv", HEADER)
+        self.write_list("it.csv", HEADER + ROW)
+
+    def tearDown(self):
+        shutil.rmtree(self.lists_path)
+
+    def write_list(self, file_name, content):
+        with open(os.path.join(self.lists_path, file_name), "w") as out_file:
+            out_file.write(content)
+
+    def assertRelints(self, **kwargs):
+        self.assertEqual(lint(self.lists_path, **kwargs).errors, [])
+        self.write_list("it.csv", HEADER + ROW + BAD_ROW)
+        errors = lint(self.lists_path, **kwargs).errors
+        self.assertEqual([(type(e), e.value, e.line_number) for e in errors],
+                         [(InvalidURL, "https://example.org", 3)])
+
+    def test_relint(self):
+        self.assertRelints()
+
+    def test_relint_cached(self):
+        self.assertRelints(
+            cache_path=os.path.join(self.lists_path, ".lint-cache"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# Checks prune-dead-urls.py against a stub resolver.
+#
+# $ python -m pytest scripts/tests/
+
+import os
+import csv
+import sys
+import socket
+import shutil
+import tempfile
+import threading
+import unittest
+import importlib.util
+
+# XXX perhaps make this better
+SCRIPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(SCRIPTS_PATH)
+spec = importlib.util.spec_from_file_location(
+    "prune_dead_urls", os.path.join(SCRIPTS_PATH, "prune-dead-urls.py"))
+prune_dead_urls = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(prune_dead_urls)
+
+HEADER = ["url", "category_code", "category_description", "date_added",
+          "source", "notes"]
+
+def make_row(url):
+    return [url, "NEWS", "News Media", "2020-01-02", "", ""]
+
+class StubResolver(object):
+    """
+    Resolves every domain but the ones in dead, and the ones in flaky from
+    their second lookup on.
+    """
+    def __init__(self, dead=(), flaky=()):
+        self.dead = set(dead)
+        self.flaky = set(flaky)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, domain):
+        with self.lock:
+            self.calls.append(domain)
+            first = self.calls.count(domain) == 1
+        if domain in self.dead or (domain in self.flaky and first):
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+class PruneDeadURLsTest(unittest.TestCase):
+    def setUp(self):
+        self.lists_path = tempfile.mkdtemp(prefix="testlists-prune-")
+
+    def tearDown(self):
+        shutil.rmtree(self.lists_path)
+
+    def write_list(self, file_name, urls):
+        with open(os.path.join(self.lists_path, file_name), "w") as out_file:
+            writer = csv.writer(out_file, lineterminator="\n")
+            writer.writerow(HEADER)
+            writer.writerows(make_row(url) for url in urls)
+
+    def read_urls(self, file_name):
+        with open(os.path.join(self.lists_path, file_name)) as in_file:
+            return [row[0] for row in csv.reader(in_file)][1:]
+
+    def test_retry(self):
+        self.write_list("it.csv", [
+            "https://alive.test/",
+            "https://flaky.test/",
+            "https://dead.test/",
+            "https://a.gone.test/",
+            "https://b.gone.test/"
+        ])
+        resolve = StubResolver(
+            dead=["dead.test", "gone.test", "a.gone.test", "b.gone.test"],
+            flaky=["flaky.test"])
+        prune_dead_urls.main(self.lists_path, concurrency=4, timeout=5,
+                             resolve=resolve)
+        self.assertEqual(self.read_urls("it.csv"),
+                         ["https://alive.test/", "https://flaky.test/"])
+        self.assertEqual(resolve.calls.count("flaky.test"), 2)
+        # The hosts under gone.test are only probed in the second pass
+        self.assertEqual(resolve.calls.count("gone.test"), 1)
+        self.assertEqual(resolve.calls.count("a.gone.test"), 1)
+
+    def test_rows_added_during_run(self):
+        self.write_list("it.csv", ["https://alive.test/", "https://dead.test/",
+                                   "https://added.test/"])
+        csv_path = os.path.join(self.lists_path, "it.csv")
+        # added.test was not in the list when its domains were read
+        self.assertTrue(prune_dead_urls.prune_dead_urls(
+            csv_path, ["alive.test", "dead.test"], set(["dead.test"])))
+        self.assertEqual(self.read_urls("it.csv"),
+                         ["https://alive.test/", "https://added.test/"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+# Checks that testlists.snapshot.Snapshot rejects files that are not
+# complete snapshots.
+#
+# $ python -m pytest scripts/tests/
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# XXX perhaps make this better
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from testlists import snapshot
+
+ROWS = [
+    ("https://example.com/", "NEWS", "News Media", "2020-01-02", "", ""),
+    ("https://example.org/", "NEWS", "News Media", "2020-01-03", "", "note")
+]
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.work_path = tempfile.mkdtemp(prefix="testlists-snapshot-")
+        self.path = os.path.join(self.work_path, "lists.snapshot")
+        writer = snapshot.SnapshotWriter()
+        writer.add_country("it", ROWS)
+        writer.write(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_path)
+
+    def test_rows(self):
+        with snapshot.Snapshot(self.path) as snap:
+            self.assertEqual(list(snap.rows("it")), ROWS)
+
+    def test_empty(self):
+        open(self.path, "w").close()
+        self.assertRaises(snapshot.InvalidSnapshot, snapshot.Snapshot,
+                          self.path)
+
+    def test_truncated(self):
+        with open(self.path, "rb") as in_file:
+            data = in_file.read()
+        for size in (snapshot.HEADER.size - 1, snapshot.HEADER.size,
+                     len(data) - 4):
+            with open(self.path, "wb") as out_file:
+                out_file.write(data[:size])
+            self.assertRaises(snapshot.InvalidSnapshot, snapshot.Snapshot,
+                              self.path)
+
+if __name__ == "__main__":
+    unittest.main()
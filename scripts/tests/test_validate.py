@@ -0,0 +1,105 @@
+# Checks that testlists.validate.validate_url() reports the same first
+# violation as the check() that lint-lists.py used before it, on every URL
+# of the test lists, on edge cases and on random strings.
+#
+# $ python -m pytest scripts/tests/
+
+import os
+import re
+import sys
+import random
+import unittest
+
+from urllib.parse import urlparse
+
+# XXX perhaps make this better
+SCRIPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(SCRIPTS_PATH)
+from testlists import corpus
+from testlists.validate import validate_url
+
+LISTS_PATH = os.path.join(SCRIPTS_PATH, "..", "lists")
+
+REFERENCE_VALID_URL = re.compile(
+        r'^(?:http)s?://' # http:// or https://
+        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|' #domain...
+        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})' # ...or ip
+        r'(?::\d+)?' # optional port
+        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+REFERENCE_BAD_CHARS = ["\r", "\n", "\t", "\\"]
+
+def reference_check(url):
+    if not REFERENCE_VALID_URL.match(url):
+        return "No match"
+    elif any([c in url for c in REFERENCE_BAD_CHARS]):
+        return "Bad chars"
+    elif url != url.strip():
+        return "Extra spaces at ends"
+    elif urlparse(url).path == "":
+        return "No trailing slash"
+
+def check(url):
+    violations = validate_url(url)
+    if violations:
+        return violations[0]
+
+EDGE_CASES = [
+    "", " ", "http://", "https://example.com", "https://example.com/",
+    "https://example.com?q=1", "https://example.com/?q=1",
+    "https://example.com#top", "https://example.com:8080",
+    "https://example.com:8080/", "http://127.0.0.1", "http://127.0.0.1/x",
+    "ftp://example.com/", "https://example.com/\n", "https://example.com\n",
+    "https://example.com/\r", "https://example.com/a\\b", " https://example.com/",
+    "https://example.com/ ", "https://example.com/a b", "https://exa_mple.com/",
+    "HTTPS://EXAMPLE.COM/", "https://example.com./", "https://-example.com/",
+    "https://example.c/", "https://xn--80ak6aa92e.com/", "https://example.com/\t",
+    "https://user@example.com/", "https://example.com ", "https://example.com:/",
+    "https://example.com:80", "http://999.999.999.999/", "http://1.2.3/",
+    "https://example.com/?", "https://example.com?", "https://example.com\\",
+    "https://example.com/é", "https://exämple.com/", "http:/example.com/",
+    "https://a.b.c.d.example.museum/", "https://example.com/\x0b",
+    "\thttps://example.com/", "https://example.com/path\r\n",
+]
+
+FUZZ_PARTS = [
+    "http://", "https://", "HTTP://", "ftp://", "example", "xn--p1ai", ".",
+    ".com", ".co.uk", "-", "_", "/", "?", "#", ":", ":8080", "127.0.0.1",
+    "@", " ", "\t", "\n", "\r", "\\", "a", "Z", "9", "é", "%20", "=",
+]
+
+def fuzzed_urls(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(FUZZ_PARTS) for _ in range(rng.randint(0, 8)))
+
+class ValidateURLTest(unittest.TestCase):
+    def assertConforms(self, urls):
+        mismatches = [
+            (url, reference_check(url), check(url))
+            for url in urls if reference_check(url) != check(url)
+        ]
+        self.assertEqual(mismatches, [])
+
+    def test_edge_cases(self):
+        self.assertConforms(EDGE_CASES)
+
+    def test_fuzzed(self):
+        self.assertConforms(fuzzed_urls(50000))
+
+    @unittest.skipUnless(os.path.isdir(LISTS_PATH), "no test lists")
+    def test_lists(self):
+        lists = corpus.load(LISTS_PATH)
+        self.assertConforms(
+            row[0] for cc in lists.country_codes for row in lists.rows(cc) if row
+        )
+
+    def test_all_violations(self):
+        self.assertEqual(validate_url("https://example.com/"), ())
+        self.assertEqual(validate_url(" https://example.com"),
+                         ("No match", "Extra spaces at ends", "No trailing slash"))
+        self.assertEqual(validate_url("https://example.com\\"),
+                         ("No match", "Bad chars", "No trailing slash"))
+
+if __name__ == "__main__":
+    unittest.main()